@@ -2,9 +2,10 @@ import streamlit as st
 from auth import AuthSystem
 from datetime import datetime, timedelta
 import pytz
+import io
 import os
-import glob
 import logging
+from database import DatabaseManager
 
 # Configure logging
 logging.basicConfig(
@@ -16,6 +17,8 @@ logging.basicConfig(
     ]
 )
 
+BRASILIA_TZ = pytz.timezone('America/Sao_Paulo')
+
 def show_logo():
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -24,6 +27,22 @@ def show_logo():
         except:
             st.markdown("## ⚖️ LegalLex")
 
+@st.cache_resource
+def _db() -> DatabaseManager:
+    """DatabaseManager shared by every session and rerun, so they all use its one connection"""
+    return DatabaseManager()
+
+@st.cache_data(ttl=3600, max_entries=64)
+def list_analyses(date_str: str, analyses_version: tuple) -> list:
+    """Publications with analyses for a date, cached until the analyses or publications change"""
+    return _db().get_publications_with_analyses_by_date(date_str)
+
+@st.cache_resource
+def _get_scheduler():
+    """Shared CronJobScheduler used to load and save custom rules"""
+    from cronjob_scheduler import CronJobScheduler
+    return CronJobScheduler()
+
 def admin_page():
     logging.info("Admin page accessed")
     show_logo()
@@ -38,8 +57,6 @@ def admin_page():
     st.markdown("Vincule análises jurídicas às publicações específicas do banco de dados.")
     
     # Date selector for publications
-    from database import DatabaseManager
-    
     selected_date = st.date_input(
         "📅 Selecione a data das publicações:",
         value=datetime.now().date(),
@@ -47,7 +64,7 @@ def admin_page():
     )
     
     # Get publications for selected date
-    db = DatabaseManager()
+    db = _db()
     date_str = selected_date.strftime('%d/%m/%Y')
     publications = db.get_publications_for_date_dropdown(date_str)
     
@@ -78,13 +95,14 @@ def admin_page():
     if uploaded_file and selected_publication_id:
         if st.button("📤 Enviar Análise", type="primary"):
             try:
-                # Read HTML content
-                html_content = uploaded_file.read().decode('utf-8')
+                # Decode straight from the upload buffer (no intermediate bytes copy)
+                html_content = str(uploaded_file.getbuffer(), 'utf-8')
                 
-                # Generate unique filename with timestamp
+                # Generate unique filename: one timestamp per upload plus the linked publication,
+                # so same-second uploads for different processes never share a name
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                original_name = uploaded_file.name.replace('.html', '')
-                filename = f"{timestamp}_{original_name}.html"
+                original_name = os.path.splitext(uploaded_file.name)[0]
+                filename = f"{timestamp}_{selected_publication_id}_{original_name}.html"
                 
                 # Save to database
                 analysis_id = db.save_analysis(
@@ -94,7 +112,8 @@ def admin_page():
                     html_content=html_content,
                     uploaded_by="lucasaurich"
                 )
-                
+                list_analyses.clear()
+
                 logging.info(f"Analysis uploaded and linked: ID {analysis_id} to publication {selected_publication_id}")
                 st.success(f"✅ Análise '{uploaded_file.name}' vinculada ao processo com sucesso!")
                 st.info(f"🔗 Análise ID: {analysis_id}")
@@ -112,14 +131,47 @@ def admin_page():
     st.markdown("---")
     st.markdown("### 📊 Análises Cadastradas")
     
+    # Result of a bulk delete from the previous run (set just before its st.rerun)
+    if 'analyses_deleted_message' in st.session_state:
+        st.success(st.session_state.pop('analyses_deleted_message'))
+    
     try:
-        stats = db.get_statistics()
-        total_analyses = stats.get('total_analyses', 0)
+        # Single COUNT/MAX query instead of the full get_statistics() scan
+        total_analyses, *_ = db.get_analyses_version()
         st.info(f"📈 Total de análises no banco: {total_analyses}")
         
         if total_analyses > 0:
-            # Could add a management section here in the future
             st.markdown("*Análises estão vinculadas às publicações e aparecem automaticamente nos cards.*")
+            
+            # Analyses of the selected date in a single editable table (one widget instead of N rows)
+            date_analyses = list_analyses(date_str, db.get_analyses_version())
+            if date_analyses:
+                import pandas as pd
+                
+                analyses_df = pd.DataFrame(
+                    {
+                        "Processo": [item['publication']['numeroprocessocommascara'] for item in date_analyses],
+                        "Nome": [item['analysis']['original_filename'] for item in date_analyses],
+                        "Criado": [item['analysis']['upload_date'] for item in date_analyses],
+                        "Deletar": False
+                    },
+                    index=[item['analysis']['id'] for item in date_analyses]
+                )
+                
+                edited_df = st.data_editor(
+                    analyses_df,
+                    disabled=["Processo", "Nome", "Criado"],
+                    hide_index=True,
+                    key="analyses_editor"
+                )
+                
+                selected_ids = edited_df.index[edited_df["Deletar"]].tolist()
+                if selected_ids and st.button(f"🗑️ Deletar {len(selected_ids)} análise(s)", key="delete_analyses"):
+                    deleted = db.delete_analyses(selected_ids)
+                    list_analyses.clear()
+                    logging.info(f"Deleted {deleted} analyses: {selected_ids}")
+                    st.session_state.analyses_deleted_message = f"✅ {deleted} análise(s) removida(s)."
+                    st.rerun()
         
     except Exception as e:
         st.error(f"Erro ao carregar estatísticas: {str(e)}")
@@ -166,85 +218,17 @@ def show_rules_config():
     st.markdown("---")
     
     # Show next execution time
-    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-    tomorrow_6am = datetime.now(brasilia_tz).replace(hour=6, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    tomorrow_6am = datetime.now(BRASILIA_TZ).replace(hour=6, minute=0, second=0, microsecond=0) + timedelta(days=1)
     
     st.info(f"⏰ **Próxima execução automática:** {tomorrow_6am.strftime('%d/%m/%Y às %H:%M')} (Brasília)")
     st.markdown("As regras configuradas abaixo serão executadas automaticamente todos os dias às 6:00 da manhã.")
     
     # Import the rule configuration from the original system
-    from djesearchapp import create_rule_form, SearchRule, ExclusionRule
+    from djesearchapp import create_rule_form
     
-    # Initialize session state for rules with hardcoded defaults
+    # Initialize session state with the hardcoded default rules plus the custom rules saved to file
     if 'auto_rules' not in st.session_state:
-        # Create default hardcoded rules
-        from djesearchapp import SearchRule
-        
-        default_rules = [
-            SearchRule(
-                name="OAB Principal",
-                enabled=True,
-                parameters={
-                    'numeroOab': '8773', 
-                    'ufOab': 'ES',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            ),
-            SearchRule(
-                name="Darwin",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'Darwin', 
-                    'siglaOrgaoJulgador': 'TJES',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            ),
-            SearchRule(
-                name="Sinales",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'SINALES SINALIZAÇÃO ESPÍRITO SANTO LTDA',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                },
-                exclusions=[
-                    ExclusionRule(
-                        name="Excluir OAB 014072 ES",
-                        field="numeroOab",
-                        value="014072",
-                        enabled=True
-                    )
-                ]
-            ),
-            SearchRule(
-                name="Multivix",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'Multivix',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            ),
-            SearchRule(
-                name="CENTRO UNIVERSITÁRIO CLARETIANO",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'Claretiano',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            )
-        ]
-        
-        # Load additional saved rules from file and append them
-        try:
-            from cronjob_scheduler import CronJobScheduler
-            scheduler = CronJobScheduler()
-            saved_custom_rules = scheduler.load_saved_rules()
-            # Combine default rules with any custom saved rules
-            all_rules = default_rules + saved_custom_rules
-            st.session_state.auto_rules = all_rules
-            logging.info(f"Loaded {len(default_rules)} default rules + {len(saved_custom_rules)} custom rules")
-        except Exception as e:
-            logging.warning(f"Could not load custom rules, using defaults only: {str(e)}")
-            st.session_state.auto_rules = default_rules
+        st.session_state.auto_rules = _get_scheduler().load_all_rules()
     
     # Rule management buttons
     col1, col2, col3 = st.columns(3)
@@ -262,8 +246,7 @@ def show_rules_config():
         if st.button("💾 Salvar Regras"):
             # Save rules using CronJobScheduler
             try:
-                from cronjob_scheduler import CronJobScheduler
-                scheduler = CronJobScheduler()
+                scheduler = _get_scheduler()
                 
                 # Get configured rules from session state
                 rules_to_save = []
@@ -296,6 +279,9 @@ def show_rules_config():
     # Display rule summary
     if configured_rules:
         st.markdown("## 📋 Resumo das Regras Configuradas")
+        
+        # Build all cards first and emit them in a single markdown call (one delta instead of N)
+        summary_html = io.StringIO()
         for rule in configured_rules:
             status = "✅ Ativa" if rule.enabled else "❌ Inativa"
             params_text = []
@@ -303,13 +289,15 @@ def show_rules_config():
                 if key != '_rule_name':
                     params_text.append(f"{key}: {value}")
             
-            st.markdown(f"""
+            summary_html.write(f"""
             <div style="border: 1px solid #ddd; border-radius: 8px; padding: 15px; margin: 10px 0; background-color: #f9f9f9; border-left: 4px solid #28a745;">
                 <strong>{rule.name}</strong> - {status}<br>
                 <small>Parâmetros: {', '.join(params_text) if params_text else 'Nenhum'}</small><br>
                 <small>Exclusões: {len(rule.exclusions) if hasattr(rule, 'exclusions') and rule.exclusions else 0}</small>
             </div>
-            """, unsafe_allow_html=True)
+            """)
+        
+        st.markdown(summary_html.getvalue(), unsafe_allow_html=True)
 
 def show_daily_results():
     st.title("📋 Resultados das Buscas Automáticas")
@@ -326,39 +314,36 @@ def show_daily_results():
     # Mock results for now - in production this would load from database
     st.markdown(f"### Resultados de {selected_date.strftime('%d/%m/%Y')}")
     
-    # Check if we have stored results for this date
+    # Check if we have stored results for this date.
+    # Database results are only counted here; rows are fetched one page at a time below.
     publications = None
+    total_items = 0
+    db = _db()
+    date_str = selected_date.strftime('%d/%m/%Y')
     
     # First, try to load from database for the selected date
     try:
-        from database import DatabaseManager
-        
-        db = DatabaseManager()
-        date_str = selected_date.strftime('%d/%m/%Y')
-        
-        # Get publications from database
-        publications = db.get_publications_by_date(date_str)
-        if publications:
-            logging.info(f"Loaded {len(publications)} publications from database for {date_str}")
+        total_items = db.count_publications_by_date(date_str)
+        if total_items:
+            logging.info(f"Found {total_items} publications in database for {date_str}")
             
     except Exception as e:
         logging.error(f"Error loading results from database for {selected_date}: {str(e)}")
     
     # Fallback to session state if no file found and date matches today
-    if not publications and 'last_auto_search_results' in st.session_state and 'last_search_date' in st.session_state:
+    if not total_items and 'last_auto_search_results' in st.session_state and 'last_search_date' in st.session_state:
         if st.session_state.last_search_date.date() == selected_date:
             publications = st.session_state.last_auto_search_results
+            total_items = len(publications)
             logging.info(f"Using session state results for {selected_date}")
     
     # If we have publications, display them
-    if publications:
+    if total_items:
         from djesearchapp import display_publication_card
-        import math
         
         # Pagination
         items_per_page = 10
-        total_items = len(publications)
-        total_pages = math.ceil(total_items / items_per_page) if total_items > 0 else 1
+        total_pages = -(-total_items // items_per_page) if total_items > 0 else 1
         
         if total_pages > 1:
             col1, col2, col3 = st.columns([1, 2, 1])
@@ -369,7 +354,10 @@ def show_daily_results():
         
         start_idx = (page - 1) * items_per_page
         end_idx = start_idx + items_per_page
-        current_items = publications[start_idx:end_idx]
+        if publications is None:
+            current_items = db.get_publications_by_date(date_str, limit=items_per_page, offset=start_idx)
+        else:
+            current_items = publications[start_idx:end_idx]
         
         st.info(f"📊 Mostrando {len(current_items)} de {total_items} publicações encontradas")
         
@@ -381,61 +369,104 @@ def show_daily_results():
         st.markdown("## 📊 Exportar Resultados")
         if st.button("📋 Baixar em Excel"):
             try:
-                import pandas as pd
+                import xlsxwriter
                 from io import BytesIO
                 
-                # Prepare data for Excel
-                excel_data = []
-                for pub in publications:
+                # The export needs every row, so only here is the full result set loaded
+                if publications is None:
+                    publications = db.get_publications_by_date(date_str)
+                
+                # Excel columns - each publicação becomes one row
+                headers = (
+                    'data_disponibilizacao', 'sigla_tribunal', 'tipo_comunicacao', 'nome_orgao',
+                    'texto', 'numero_processo', 'numero_processo_simples', 'meio', 'link',
+                    'tipo_documento', 'nome_classe', 'codigo_classe', 'destinatarios',
+                    'advogados', 'hash', 'data_disponibilizacao_alt', 'fonte_regra'
+                )
+                
+                # constant_memory streams each row into the xlsx and frees it after writing
+                # (in_memory would override it, so rows are spooled through a temp file).
+                # Cells are always plain text: no formulas from values starting with "=", no URLs
+                output = BytesIO()
+                workbook = xlsxwriter.Workbook(output, {
+                    'constant_memory': True,
+                    'strings_to_formulas': False,
+                    'strings_to_urls': False
+                })
+                worksheet = workbook.add_worksheet('Publicações')
+                worksheet.write_row(0, 0, headers, workbook.add_format({'bold': True}))
+                
+                # Excel cells hold at most 32,767 characters; longer values are cut with a marker
+                max_cell_len = 32767
+                truncated_marker = ' [...] (texto truncado)'
+                truncated_cells = 0
+                failed_cells = 0
+                
+                write_string = worksheet.write_string
+                for row_idx, pub in enumerate(publications, start=1):
+                    pub_get = pub.get
+                    
                     # Extract destinatarios (nome and polo are inside destinatarios array)
-                    destinatarios = pub.get('destinatarios', [])
-                    destinatarios_text = '; '.join([
-                        f"{dest.get('nome', '')} ({dest.get('polo', '')})" 
-                        for dest in destinatarios
-                    ]) if destinatarios else ''
+                    destinatarios = pub_get('destinatarios')
+                    if not destinatarios:
+                        destinatarios_text = ''
+                    else:
+                        destinatarios_text = '; '.join(
+                            f"{dest.get('nome', '')} ({dest.get('polo', '')})"
+                            for dest in destinatarios
+                        )
                     
-                    # Extract advogados
-                    advogados = pub.get('destinatarioadvogados', [])
-                    advogados_text = '; '.join([
-                        f"{adv.get('advogado', {}).get('nome', '')} - OAB {adv.get('advogado', {}).get('numero_oab', '')} {adv.get('advogado', {}).get('uf_oab', '')}"
-                        for adv in advogados
-                    ]) if advogados else ''
+                    # Extract advogados (resolve the nested 'advogado' dict once per entry)
+                    advogados = pub_get('destinatarioadvogados')
+                    if not advogados:
+                        advogados_text = ''
+                    else:
+                        advogados_text = '; '.join(
+                            f"{adv.get('nome', '')} - OAB {adv.get('numero_oab', '')} {adv.get('uf_oab', '')}"
+                            for adv in (adv_info.get('advogado') or {} for adv_info in advogados)
+                        )
                     
-                    # Extract correct fields for Excel - each publicação becomes one row
-                    row = {
-                        'data_disponibilizacao': pub.get('data_disponibilizacao', ''),
-                        'sigla_tribunal': pub.get('siglaTribunal', ''),
-                        'tipo_comunicacao': pub.get('tipoComunicacao', ''),
-                        'nome_orgao': pub.get('nomeOrgao', ''),
-                        'texto': pub.get('texto', ''),
-                        'numero_processo': pub.get('numeroprocessocommascara', ''),
-                        'numero_processo_simples': pub.get('numero_processo', ''),
-                        'meio': pub.get('meio', ''),
-                        'link': pub.get('link', ''),
-                        'tipo_documento': pub.get('tipoDocumento', ''),
-                        'nome_classe': pub.get('nomeClasse', ''),
-                        'codigo_classe': pub.get('codigoClasse', ''),
-                        'destinatarios': destinatarios_text,
-                        'advogados': advogados_text,
-                        'hash': pub.get('hash', ''),
-                        'data_disponibilizacao_alt': pub.get('datadisponibilizacao', ''),
-                        'fonte_regra': pub.get('_source_rule', '')
-                    }
-                    excel_data.append(row)
+                    row_values = (
+                        pub_get('data_disponibilizacao', ''),
+                        pub_get('siglaTribunal', ''),
+                        pub_get('tipoComunicacao', ''),
+                        pub_get('nomeOrgao', ''),
+                        pub_get('texto', ''),
+                        pub_get('numeroprocessocommascara', ''),
+                        pub_get('numero_processo', ''),
+                        pub_get('meio', ''),
+                        pub_get('link', ''),
+                        pub_get('tipoDocumento', ''),
+                        pub_get('nomeClasse', ''),
+                        pub_get('codigoClasse', ''),
+                        destinatarios_text,
+                        advogados_text,
+                        pub_get('hash', ''),
+                        pub_get('datadisponibilizacao', ''),
+                        pub_get('_source_rule', '')
+                    )
+                    
+                    # One cell at a time, so a rejected value can't drop the rest of the row
+                    for col_idx, value in enumerate(row_values):
+                        text = '' if value is None else str(value)
+                        if len(text) > max_cell_len:
+                            text = text[:max_cell_len - len(truncated_marker)] + truncated_marker
+                            truncated_cells += 1
+                        if write_string(row_idx, col_idx, text) < 0:
+                            failed_cells += 1
+                            logging.error(f"Excel export: could not write row {row_idx}, column {headers[col_idx]}")
                 
-                # Create DataFrame
-                df = pd.DataFrame(excel_data)
+                workbook.close()
                 
-                # Create Excel file in memory
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Publicações')
+                if truncated_cells:
+                    st.warning(f"⚠️ {truncated_cells} campo(s) excederam o limite de {max_cell_len} caracteres do Excel e foram truncados.")
+                if failed_cells:
+                    st.error(f"❌ {failed_cells} campo(s) não puderam ser gravados no Excel.")
                 
                 # Get the Excel data
                 excel_bytes = output.getvalue()
                 
                 # Generate filename with date
-                brasilia_tz = pytz.timezone('America/Sao_Paulo')
                 date_str = selected_date.strftime('%d-%m-%Y')
                 filename = f"Busca_do_dia_{date_str}.xlsx"
                 
@@ -455,21 +486,20 @@ def show_daily_results():
     else:
         st.warning("⚠️ Nenhum resultado encontrado para esta data.")
     
-    # Debug database info
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        search_history = db.get_search_history(limit=10)
-        if search_history:
-            st.info(f"📊 Database conectada! Últimas {len(search_history)} buscas encontradas.")
-            with st.expander("Ver histórico de buscas"):
-                for search in search_history:
-                    st.write(f"• {search['name']} - {search['date']} ({search['publications_found']} publicações)")
-        else:
-            st.warning("⚠️ Database conectada mas nenhuma busca encontrada.")
-    except Exception as e:
-        st.error(f"❌ Erro na database: {str(e)}")
-        logging.error(f"Database debug error: {str(e)}")
+    # Debug database info (queried only on demand)
+    with st.expander("🐛 Debug Database", expanded=False):
+        if st.checkbox("Mostrar histórico", key="show_search_history"):
+            try:
+                search_history = db.get_search_history(limit=10)
+                if search_history:
+                    st.info(f"📊 Database conectada! Últimas {len(search_history)} buscas encontradas.")
+                    for search in search_history:
+                        st.write(f"• {search['name']} - {search['date']} ({search['publications_found']} publicações)")
+                else:
+                    st.warning("⚠️ Database conectada mas nenhuma busca encontrada.")
+            except Exception as e:
+                st.error(f"❌ Erro na database: {str(e)}")
+                logging.error(f"Database debug error: {str(e)}")
 
     # Manual execution button (for testing)
     if st.button("🔍 Executar Busca Manual (Teste)", type="secondary"):
@@ -497,16 +527,10 @@ def show_daily_results():
                 
                 # Save results to database
                 try:
-                    from database import DatabaseManager
-                    
                     st.info(f"🔍 Debug: Tentando salvar {len(publications)} publicações...")
                     
-                    # Create database manager instance
-                    db = DatabaseManager()
-                    
                     # Create filename with today's date
-                    brasilia_tz = pytz.timezone('America/Sao_Paulo')
-                    brasilia_now = datetime.now(brasilia_tz)
+                    brasilia_now = datetime.now(BRASILIA_TZ)
                     date_str = brasilia_now.strftime('%d/%m/%Y')
                     filename = f"Busca do dia {date_str}"
                     
@@ -563,11 +587,11 @@ def show_analyses_page():
     )
     
     # Get publications with analyses from database
-    from database import DatabaseManager
-    db = DatabaseManager()
+    db = _db()
     date_str = selected_date.strftime('%d/%m/%Y')
     
-    publications_with_analyses = db.get_publications_with_analyses_by_date(date_str)
+    # Cache is keyed on the analyses/publications fingerprint, so uploads, deletes and re-runs invalidate it
+    publications_with_analyses = list_analyses(date_str, db.get_analyses_version())
     
     if not publications_with_analyses:
         st.info(f"📄 Nenhuma análise encontrada para {date_str}.")
@@ -584,7 +608,7 @@ def show_analyses_page():
         analysis = item['analysis']
         
         # Display publication card with integrated analysis
-        display_publication_with_analysis(publication, analysis, i)
+        display_publication_with_analysis(publication, analysis, i, db)
         
         # Add some spacing between items
         if i < len(publications_with_analyses) - 1:
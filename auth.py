@@ -1,5 +1,6 @@
 import streamlit as st
 import hashlib
+import hmac
 
 class AuthSystem:
     USERS = {
@@ -13,20 +14,29 @@ class AuthSystem:
         }
     }
     
+    # SHA-256 digests computed once at import; logins only hash the submitted password
+    _HASHED = {
+        username: (hashlib.sha256(data["password"].encode()).digest(), data["role"])
+        for username, data in USERS.items()
+    }
+    
     @staticmethod
     def hash_password(password: str) -> str:
         return hashlib.sha256(password.encode()).hexdigest()
     
     @staticmethod
     def authenticate(username: str, password: str) -> dict:
-        if username in AuthSystem.USERS:
-            user_data = AuthSystem.USERS[username]
-            if user_data["password"] == password:
-                return {
-                    "username": username,
-                    "role": user_data["role"],
-                    "authenticated": True
-                }
+        entry = AuthSystem._HASHED.get(username)
+        if entry is None:
+            return {"authenticated": False}
+        
+        password_digest, role = entry
+        if hmac.compare_digest(password_digest, hashlib.sha256(password.encode()).digest()):
+            return {
+                "username": username,
+                "role": role,
+                "authenticated": True
+            }
         return {"authenticated": False}
     
     @staticmethod
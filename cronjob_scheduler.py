@@ -1,13 +1,20 @@
-import json
 import os
 import pickle
-import schedule
-import time
+import asyncio
+import gzip
+import mmap
+import zlib
+import tempfile
 from datetime import datetime, timedelta
-import pytz
+from zoneinfo import ZoneInfo
 from typing import List, Dict, Any
 import logging
-from publiregras import EnhancedDJESearcher, SearchRule
+import functools
+import operator
+from pathlib import Path
+from publiregras import EnhancedDJESearcher, SearchRule, RuleType, RuleOperator
+from djesearchapp import SearchRule as DjeSearchRule, ExclusionRule
+from database import json_dumps, json_loads
 
 # Configure logging
 logging.basicConfig(
@@ -19,11 +26,56 @@ logging.basicConfig(
     ]
 )
 
+BRASILIA_TZ = ZoneInfo('America/Sao_Paulo')
+
+# Default hardcoded rules as (name, parameters, exclusions); the search date is added per run
+_DEFAULT_RULE_TEMPLATES = (
+    ("OAB Principal", {'numeroOab': '8773', 'ufOab': 'ES'}, ()),
+    ("Darwin", {'nomeParte': 'Darwin', 'siglaOrgaoJulgador': 'TJES'}, ()),
+    (
+        "Sinales",
+        {'nomeParte': 'SINALES SINALIZAÇÃO ESPÍRITO SANTO LTDA'},
+        (("Excluir OAB 014072 ES", "numeroOab", "014072"),)
+    ),
+    ("Multivix", {'nomeParte': 'Multivix'}, ()),
+    ("CENTRO UNIVERSITÁRIO CLARETIANO", {'nomeParte': 'Claretiano'}, ()),
+)
+
+# Fields persisted for each saved (publiregras) SearchRule, fetched in one call per rule
+_RULE_FIELDS = operator.attrgetter('name', 'rule_type', 'operator', 'enabled', 'parameters')
+
+def _atomic_write_bytes(path: str, data: bytes):
+    """Write through a temp file and rename it over path, so readers never see a partial file.
+    The temp file gets a unique name, so concurrent writers of the same path don't share it"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# A results file holds a whole day of publications, so only keep the last few parsed
+@functools.lru_cache(maxsize=4)
+def _load_results_cached(results_file: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse a results file; mtime_ns is part of the key so rewritten files are reloaded.
+    The returned dict is shared by every caller and must not be modified"""
+    # Parse straight from a read-only mapping of the file instead of copying it onto the heap first
+    with open(results_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            if results_file.endswith('.gz'):
+                return json_loads(zlib.decompress(view, wbits=zlib.MAX_WBITS | 16))
+            return json_loads(view)
+
 class CronJobScheduler:
     def __init__(self):
         self.rules_file = "data/saved_rules.json"
         self.results_dir = "daily_results"
-        self.brasilia_tz = pytz.timezone('America/Sao_Paulo')
+        self.brasilia_tz = BRASILIA_TZ
+        self.run_hour, self.run_minute = 6, 0  # Daily run time (Brasília)
         
         # Ensure directories exist
         os.makedirs("data", exist_ok=True)
@@ -33,13 +85,11 @@ class CronJobScheduler:
         """Load saved rules from file"""
         try:
             if os.path.exists(self.rules_file):
-                with open(self.rules_file, 'r', encoding='utf-8') as f:
-                    rules_data = json.load(f)
+                rules_data = json_loads(Path(self.rules_file).read_bytes())
                 
                 rules = []
                 for rule_data in rules_data:
                     # Reconstruct SearchRule objects
-                    from publiregras import RuleType, RuleOperator
                     rule = SearchRule(
                         name=rule_data['name'],
                         rule_type=RuleType(rule_data['rule_type']),
@@ -51,68 +101,25 @@ class CronJobScheduler:
                 
                 return rules
         except Exception as e:
-            logging.error(f"Error loading rules: {str(e)}")
+            logging.error("Error loading rules: %s", e)
         
         return []
     
     def load_all_rules(self) -> List[SearchRule]:
         """Load all rules (default hardcoded + custom saved rules)"""
-        from djesearchapp import SearchRule, ExclusionRule
-        
         # Default hardcoded rules that always exist
-        from datetime import datetime
-        
+        today = datetime.now().strftime('%Y-%m-%d')
         default_rules = [
-            SearchRule(
-                name="OAB Principal",
+            DjeSearchRule(
+                name=name,
                 enabled=True,
-                parameters={
-                    'numeroOab': '8773', 
-                    'ufOab': 'ES',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            ),
-            SearchRule(
-                name="Darwin",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'Darwin', 
-                    'siglaOrgaoJulgador': 'TJES',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            ),
-            SearchRule(
-                name="Sinales",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'SINALES SINALIZAÇÃO ESPÍRITO SANTO LTDA',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                },
+                parameters={**parameters, 'dataDisponibilizacaoInicio': today},
                 exclusions=[
-                    ExclusionRule(
-                        name="Excluir OAB 014072 ES",
-                        field="numeroOab",
-                        value="014072",
-                        enabled=True
-                    )
+                    ExclusionRule(name=exclusion_name, field=field, value=value, enabled=True)
+                    for exclusion_name, field, value in exclusions
                 ]
-            ),
-            SearchRule(
-                name="Multivix",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'Multivix',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
-            ),
-            SearchRule(
-                name="CENTRO UNIVERSITÁRIO CLARETIANO",
-                enabled=True,
-                parameters={
-                    'nomeParte': 'Claretiano',
-                    'dataDisponibilizacaoInicio': datetime.now().strftime('%Y-%m-%d')
-                }
             )
+            for name, parameters, exclusions in _DEFAULT_RULE_TEMPLATES
         ]
         
         # Load additional custom rules from file
@@ -120,35 +127,34 @@ class CronJobScheduler:
         
         # Combine default + custom rules
         all_rules = default_rules + custom_rules
-        logging.info(f"Loaded {len(default_rules)} default rules + {len(custom_rules)} custom rules")
+        logging.info("Loaded %d default rules + %d custom rules", len(default_rules), len(custom_rules))
         
         return all_rules
     
     def save_rules(self, rules: List[SearchRule]):
         """Save rules to file"""
         try:
-            rules_data = []
-            for rule in rules:
-                rule_data = {
-                    'name': rule.name,
-                    'rule_type': rule.rule_type.value,
-                    'operator': rule.operator.value,
-                    'enabled': rule.enabled,
-                    'parameters': rule.parameters
+            rules_data = [
+                {
+                    'name': name,
+                    'rule_type': rule_type.value,
+                    'operator': rule_operator.value,
+                    'enabled': enabled,
+                    'parameters': parameters
                 }
-                rules_data.append(rule_data)
+                for name, rule_type, rule_operator, enabled, parameters in map(_RULE_FIELDS, rules)
+            ]
             
-            with open(self.rules_file, 'w', encoding='utf-8') as f:
-                json.dump(rules_data, f, ensure_ascii=False, indent=2)
+            _atomic_write_bytes(self.rules_file, json_dumps(rules_data, indent=True))
             
-            logging.info(f"Saved {len(rules)} rules to {self.rules_file}")
+            logging.info("Saved %d rules to %s", len(rules), self.rules_file)
         except Exception as e:
-            logging.error(f"Error saving rules: {str(e)}")
+            logging.error("Error saving rules: %s", e)
     
     def execute_daily_search(self):
         """Execute the daily automated search"""
         brasilia_now = datetime.now(self.brasilia_tz)
-        logging.info(f"Starting daily search at {brasilia_now.strftime('%Y-%m-%d %H:%M:%S')} (Brasília)")
+        logging.info("Starting daily search at %s (Brasília)", brasilia_now.strftime('%Y-%m-%d %H:%M:%S'))
         
         # Load all rules (default + custom)
         rules = self.load_all_rules()
@@ -162,14 +168,14 @@ class CronJobScheduler:
             logging.warning("No enabled rules found for daily search")
             return
         
-        logging.info(f"Executing search with {len(enabled_rules)} enabled rules")
+        logging.info("Executing search with %d enabled rules", len(enabled_rules))
         
         try:
             # Execute search
             searcher = EnhancedDJESearcher()
             
             def log_progress(message):
-                logging.info(f"Search progress: {message}")
+                logging.info("Search progress: %s", message)
             
             publications = searcher.execute_rules(enabled_rules, log_progress)
             
@@ -190,58 +196,90 @@ class CronJobScheduler:
                     stats={'automatic_search': True}
                 )
                 
-                logging.info(f"Daily search completed successfully. Found {len(publications)} publications. Results saved to database with ID {search_execution_id}")
+                logging.info("Daily search completed successfully. Found %d publications. Results saved to database with ID %s", len(publications), search_execution_id)
                 
             except Exception as e:
-                logging.error(f"Error saving daily search results to database: {str(e)}")
+                logging.error("Error saving daily search results to database: %s", e)
                 # Fallback to file save
                 date_str_file = brasilia_now.strftime('%Y-%m-%d')
-                results_file = os.path.join(self.results_dir, f"results_{date_str_file}.json")
+                results_file = os.path.join(self.results_dir, f"results_{date_str_file}.json.gz")
                 
-                results_data = {
+                results_header = {
                     'date': date_str_file,
                     'timestamp': brasilia_now.isoformat(),
                     'rules_executed': len(enabled_rules),
-                    'publications_found': len(publications),
-                    'publications': publications
+                    'publications_found': len(publications)
                 }
                 
-                with open(results_file, 'w', encoding='utf-8') as f:
-                    json.dump(results_data, f, ensure_ascii=False, indent=2)
+                self._write_results_file(results_file, results_header, publications)
                 
-                logging.info(f"Daily search completed successfully. Found {len(publications)} publications. Fallback saved to {results_file}")
+                logging.info("Daily search completed successfully. Found %d publications. Fallback saved to %s", len(publications), results_file)
             
         except Exception as e:
-            logging.error(f"Error during daily search: {str(e)}")
+            logging.error("Error during daily search: %s", e)
+    
+    def _write_results_file(self, results_file: str, header: Dict[str, Any], publications: List[Dict]):
+        """Stream results to disk one publication at a time instead of serializing one big document"""
+        tmp_file = f"{results_file}.tmp"
+        with open(tmp_file, 'wb') as raw:
+            # Level 1 gzip: the repetitive publication JSON compresses well at near-disk speed
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as f:
+                f.write(b'{')
+                for key, value in header.items():
+                    f.write(json_dumps(key, indent=True) + b': ' + json_dumps(value, indent=True) + b', ')
+                f.write(b'"publications": [')
+                for i, pub in enumerate(publications):
+                    if i:
+                        f.write(b', ')
+                    f.write(json_dumps(pub, indent=True))
+                f.write(b']}')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_file, results_file)
     
     def get_daily_results(self, date_str: str) -> Dict[str, Any]:
-        """Get results for a specific date"""
-        results_file = os.path.join(self.results_dir, f"results_{date_str}.json")
+        """Get results for a specific date. The top-level dict and publications list are the
+        caller's own; the publication dicts inside are shared with the cache and read-only"""
+        base_file = os.path.join(self.results_dir, f"results_{date_str}.json")
         
-        if os.path.exists(results_file):
-            try:
-                with open(results_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logging.error(f"Error loading results for {date_str}: {str(e)}")
+        # Prefer the gzipped file; plain .json files from older runs are still readable
+        for results_file in (f"{base_file}.gz", base_file):
+            if os.path.exists(results_file):
+                try:
+                    results = _load_results_cached(results_file, os.stat(results_file).st_mtime_ns)
+                    return {**results, 'publications': list(results.get('publications', []))}
+                except Exception as e:
+                    logging.error("Error loading results for %s: %s", date_str, e)
+                break
         
         return None
     
-    def schedule_daily_job(self):
-        """Schedule the daily job for 6:00 AM Brasília time"""
-        # Schedule for 6:00 AM every day
-        schedule.every().day.at("06:00").do(self.execute_daily_search)
-        logging.info("Daily job scheduled for 6:00 AM Brasília time")
+    def _next_run_after(self, moment: datetime) -> datetime:
+        """First daily run time in Brasília strictly after moment"""
+        next_run = moment.replace(hour=self.run_hour, minute=self.run_minute, second=0, microsecond=0)
+        if next_run <= moment:
+            next_run += timedelta(days=1)
+        return next_run
+    
+    async def _runner(self):
+        """Sleep until each daily run and execute the search in a worker thread"""
+        next_run = self._next_run_after(datetime.now(self.brasilia_tz))
+        while True:
+            # The monotonic sleep can end slightly before the wall clock reaches next_run
+            # (e.g. NTP slew), so sleep again for what is left rather than firing early
+            while (remaining := (next_run - datetime.now(self.brasilia_tz)).total_seconds()) > 0:
+                await asyncio.sleep(remaining)
+            await asyncio.to_thread(self.execute_daily_search)
+            # Schedule from the run that just happened, not from now, so it can't fire twice
+            next_run = self._next_run_after(next_run)
     
     def run_scheduler(self):
         """Run the scheduler continuously"""
-        self.schedule_daily_job()
+        logging.info("Daily job scheduled for %02d:%02d Brasília time", self.run_hour, self.run_minute)
         logging.info("Cronjob scheduler started. Press Ctrl+C to stop.")
         
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
+            asyncio.run(self._runner())
         except KeyboardInterrupt:
             logging.info("Cronjob scheduler stopped by user")
 
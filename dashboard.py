@@ -4,13 +4,16 @@ Interactive dashboard for visualizing legal publication insights and analytics
 """
 
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
 from datetime import datetime, timedelta, date
 import logging
+from typing import TYPE_CHECKING
 from database import DatabaseManager
 
+if TYPE_CHECKING:
+    # Imported lazily where the charts are built at runtime
+    import pandas as pd
+    import plotly.graph_objects as go
+
 # Page configuration
 st.set_page_config(
     page_title="Dashboard - LegalLex MVP2",
@@ -28,30 +31,50 @@ def show_logo():
         except:
             st.markdown("### 📊 LegalLex Dashboard")
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def get_dashboard_data(start_date: str, end_date: str, selected_tribunals: list = None):
-    """Get cached dashboard data"""
-    db = DatabaseManager()
-    
-    # Get publications in date range
-    publications = db.get_publications_by_date_range(start_date, end_date, selected_tribunals)
-    
-    # Get search executions
-    search_executions = db.get_search_executions_by_date_range(start_date, end_date)
-    
-    # Get analyses coverage
-    analyses = db.get_analyses_by_date_range(start_date, end_date)
-    
-    return publications, search_executions, analyses
+@st.cache_resource
+def _db() -> DatabaseManager:
+    """Shared DatabaseManager, so the schema setup in its constructor runs once per process"""
+    return DatabaseManager()
+
+@st.cache_data(ttl=3600)
+def _available_tribunals() -> list:
+    """Tribunal options for the filter, refreshed hourly"""
+    return _db().get_available_tribunals()
+
+@st.cache_resource(ttl=300)  # Cache for 5 minutes
+def get_dashboard_data(start_date: str, end_date: str, selected_tribunals: tuple = ()) -> dict:
+    """Get cached dashboard aggregates (small DataFrames computed by SQLite).
+    Shared by reference across sessions, so callers must treat the frames as read-only.
+    selected_tribunals should be a sorted tuple, () meaning every tribunal (see _tribunal_filter)."""
+    return _db().get_dashboard_aggregates(start_date, end_date, selected_tribunals)
+
+@st.cache_data(ttl=300)  # Same lifetime as the aggregates it gates
+def _dashboard_counts(start_date: str, end_date: str) -> tuple:
+    """Cached (search executions, publications, publications in range) probe"""
+    return _db().get_dashboard_counts(start_date, end_date)
+
+def _tribunal_filter(selected_tribunals: list) -> tuple:
+    """Canonical cache key for a tribunal selection: a sorted tuple, or () when nothing is selected"""
+    if not selected_tribunals:
+        return ()
+    return tuple(sorted(selected_tribunals))
+
+def _total_publications(aggregates: dict) -> int:
+    """Total publications covered by the aggregates (0 when empty or the query failed)"""
+    kpis = aggregates.get('kpis')
+    if kpis is None or kpis.empty:
+        return 0
+    return int(kpis['total_publications'].iloc[0])
 
-def create_kpi_cards(publications: list, search_executions: list, analyses: list):
+def create_kpi_cards(kpis: 'pd.DataFrame'):
     """Create KPI cards section"""
     
-    # Calculate metrics
-    total_publications = len(publications)
-    active_tribunals = len(set([pub.get('siglaTribunal', 'N/A') for pub in publications if pub.get('siglaTribunal')]))
-    unique_lawyers = len(set([adv.get('numeroOab', 'N/A') for pub in publications for adv in pub.get('advogados', []) if adv.get('numeroOab')]))
-    total_analyses = len(analyses)
+    # Metrics were computed by the database in a single row
+    metrics = kpis.iloc[0]
+    total_publications = int(metrics['total_publications'])
+    active_tribunals = int(metrics['active_tribunals'])
+    unique_lawyers = int(metrics['unique_lawyers'])
+    total_analyses = int(metrics['total_analyses'])
     
     # Display KPIs in columns
     col1, col2, col3, col4 = st.columns(4)
@@ -85,107 +108,102 @@ def create_kpi_cards(publications: list, search_executions: list, analyses: list
             delta=f"{analysis_coverage:.1f}% cobertura"
         )
 
-def create_publications_timeline_chart(publications: list):
-    """Create publications by date line chart"""
-    if not publications:
-        st.warning("Nenhuma publicação encontrada no período selecionado")
-        return
-    
-    # Process data for timeline
-    df = pd.DataFrame(publications)
-    df['date'] = pd.to_datetime(df['datadisponibilizacao'], format='%d/%m/%Y', errors='coerce')
-    
-    # Group by date
-    timeline_data = df.groupby(df['date'].dt.date).size().reset_index()
-    timeline_data.columns = ['Data', 'Publicações']
-    
-    # Create line chart
-    fig = px.line(
-        timeline_data, 
-        x='Data', 
-        y='Publicações',
-        title='📅 Publicações por Data',
-        markers=True
-    )
-    
-    fig.update_layout(
-        height=400,
-        showlegend=False,
-        xaxis_title="Data",
-        yaxis_title="Número de Publicações"
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+# Most timeline points sent to the browser; longer periods are downsampled with LTTB
+_TIMELINE_MAX_POINTS = 500
 
-def create_tribunals_chart(publications: list):
-    """Create top tribunals bar chart"""
-    if not publications:
-        return
-    
-    # Process tribunal data
-    tribunals = [pub.get('siglaTribunal', 'N/A') for pub in publications if pub.get('siglaTribunal')]
-    tribunal_counts = pd.Series(tribunals).value_counts().head(10)
-    
-    # Create bar chart
-    fig = px.bar(
-        x=tribunal_counts.values,
-        y=tribunal_counts.index,
-        orientation='h',
-        title='🏛️ Top 10 Tribunais por Volume',
-        labels={'x': 'Número de Publicações', 'y': 'Tribunal'}
+def _lttb_indices(values: list, n_out: int) -> list:
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling of evenly spaced values"""
+    n = len(values)
+    if n <= n_out or n_out < 3:
+        return list(range(n))
+    
+    bucket_size = (n - 2) / (n_out - 2)
+    kept = [0]
+    for i in range(n_out - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        
+        # Average point of the next bucket (just the last point for the final bucket)
+        next_x = (end + next_end - 1) / 2
+        next_y = sum(values[end:next_end]) / (next_end - end)
+        prev_x, prev_y = kept[-1], values[kept[-1]]
+        
+        # Keep the point forming the largest triangle with the previous kept point and that average
+        kept.append(max(
+            range(start, end),
+            key=lambda j: abs((prev_x - next_x) * (values[j] - prev_y) - (prev_x - j) * (next_y - prev_y))
+        ))
+    kept.append(n - 1)
+    return kept
+
+@st.cache_data(max_entries=32)
+def create_dashboard_figure(aggregates: dict) -> 'go.Figure':
+    """Create all four dashboard charts as one 2x2 subplot figure (a single payload for the browser).
+    Cached on the aggregate contents, so identical data never rebuilds the figure."""
+    # Imported here so views without data never load plotly
+    import pandas as pd
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    fig = make_subplots(
+        rows=2, cols=2,
+        specs=[[{}, {}], [{'type': 'domain'}, {}]],
+        subplot_titles=(
+            '📅 Publicações por Data',
+            '🏛️ Top 10 Tribunais por Volume',
+            '📢 Distribuição por Tipo de Comunicação',
+            '⚖️ Top 10 Classes Processuais'
+        ),
+        vertical_spacing=0.12
     )
     
-    fig.update_layout(
-        height=400,
-        showlegend=False
+    # Timeline: parse the per-day labels, drop unparseable ones and fill empty days with zero
+    by_day = aggregates['by_day']
+    dates = pd.to_datetime(by_day['label'], format='%d/%m/%Y', errors='coerce', cache=True)
+    daily_counts = by_day['count'].groupby(dates).sum()
+    if not daily_counts.empty:
+        daily_counts = daily_counts.resample('D').sum()
+        if len(daily_counts) > _TIMELINE_MAX_POINTS:
+            daily_counts = daily_counts.iloc[_lttb_indices(daily_counts.tolist(), _TIMELINE_MAX_POINTS)]
+    fig.add_trace(
+        go.Scatter(x=daily_counts.index, y=daily_counts.values, mode='lines+markers',
+                   name='Publicações', showlegend=False),
+        row=1, col=1
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-
-def create_communication_types_pie(publications: list):
-    """Create communication types pie chart"""
-    if not publications:
-        return
-    
-    # Process communication types
-    comm_types = [pub.get('tipoComunicacao', 'N/A') for pub in publications if pub.get('tipoComunicacao')]
-    comm_counts = pd.Series(comm_types).value_counts()
-    
-    # Create pie chart
-    fig = px.pie(
-        values=comm_counts.values,
-        names=comm_counts.index,
-        title='📢 Distribuição por Tipo de Comunicação'
+    # Top 10 counts arrive from the database already sorted by volume
+    top_tribunals = aggregates['by_tribunal']
+    fig.add_trace(
+        go.Bar(x=top_tribunals['count'], y=top_tribunals['label'], orientation='h',
+               name='Tribunal', showlegend=False),
+        row=1, col=2
     )
     
-    fig.update_layout(height=400)
-    
-    st.plotly_chart(fig, use_container_width=True)
-
-def create_process_classes_chart(publications: list):
-    """Create process classes horizontal bar chart"""
-    if not publications:
-        return
-    
-    # Process class data
-    classes = [pub.get('nomeClasse', 'N/A') for pub in publications if pub.get('nomeClasse')]
-    class_counts = pd.Series(classes).value_counts().head(10)
-    
-    # Create horizontal bar chart
-    fig = px.bar(
-        x=class_counts.values,
-        y=class_counts.index,
-        orientation='h',
-        title='⚖️ Top 10 Classes Processuais',
-        labels={'x': 'Número de Publicações', 'y': 'Classe Processual'}
+    by_comm_type = aggregates['by_comm_type']
+    fig.add_trace(
+        go.Pie(values=by_comm_type['count'], labels=by_comm_type['label'], name='Tipo de Comunicação'),
+        row=2, col=1
     )
     
-    fig.update_layout(
-        height=400,
-        showlegend=False
+    top_classes = aggregates['by_class']
+    fig.add_trace(
+        go.Bar(x=top_classes['count'], y=top_classes['label'], orientation='h',
+               name='Classe Processual', showlegend=False),
+        row=2, col=2
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    fig.update_xaxes(title_text="Data", row=1, col=1)
+    fig.update_yaxes(title_text="Número de Publicações", row=1, col=1)
+    fig.update_xaxes(title_text="Número de Publicações", row=1, col=2)
+    fig.update_xaxes(title_text="Número de Publicações", row=2, col=2)
+    # Only the timeline is zoomable; the bar charts are display-only (no drag/zoom handlers)
+    for row, col in ((1, 2), (2, 2)):
+        fig.update_xaxes(fixedrange=True, row=row, col=col)
+        fig.update_yaxes(fixedrange=True, row=row, col=col)
+    fig.update_layout(height=800)
+    
+    return fig
 
 def main():
     """Main dashboard function"""
@@ -196,53 +214,36 @@ def main():
     st.markdown("---")
     
     # Load initial data (last 90 days) to show immediate charts
-    db = DatabaseManager()
     start_date_str = (date.today() - timedelta(days=90)).strftime('%d/%m/%Y')
     end_date_str = date.today().strftime('%d/%m/%Y')
     
-    with st.spinner("Carregando dados do dashboard..."):
-        publications, search_executions, analyses = get_dashboard_data(
-            start_date_str, end_date_str, None
-        )
+    # Check total database content and probe the recent range in one round-trip
+    total_executions, total_publications, recent_publications = _dashboard_counts(start_date_str, end_date_str)
     
-    # Check total database content
-    conn = db.get_connection()
-    cursor = conn.execute("SELECT COUNT(*) FROM search_executions")
-    total_executions = cursor.fetchone()[0]
-    cursor = conn.execute("SELECT COUNT(*) FROM publications")  
-    total_publications = cursor.fetchone()[0]
-    conn.close()
+    # Only load the last 90 days when the probe found something there
+    if recent_publications:
+        with st.spinner("Carregando dados do dashboard..."):
+            aggregates = get_dashboard_data(
+                start_date_str, end_date_str, ()
+            )
+    else:
+        aggregates = {}
     
     # Show immediate data info
-    if publications:
-        st.success(f"📊 Exibindo dados dos últimos 90 dias • {len(publications)} publicações encontradas")
+    recent_total = _total_publications(aggregates)
+    if recent_total:
+        st.success(f"📊 Exibindo dados dos últimos 90 dias • {recent_total} publicações encontradas")
         
         # KPI Cards Section
         st.markdown("### 📈 Indicadores Principais")
-        create_kpi_cards(publications, search_executions, analyses)
+        create_kpi_cards(aggregates['kpis'])
         
         st.markdown("---")
         
         # Charts Grid - Show immediately
         st.markdown("### 📊 Análises Visuais")
         
-        # First row - Timeline and Tribunals
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            create_publications_timeline_chart(publications)
-        
-        with col2:
-            create_tribunals_chart(publications)
-        
-        # Second row - Communication types and Process classes
-        col3, col4 = st.columns(2)
-        
-        with col3:
-            create_communication_types_pie(publications)
-        
-        with col4:
-            create_process_classes_chart(publications)
+        st.plotly_chart(create_dashboard_figure(aggregates), use_container_width=True)
     
     else:
         st.warning("⚠️ Nenhuma publicação encontrada nos últimos 90 dias no banco de dados")
@@ -288,33 +289,24 @@ def main():
                 if st.button("📊 Mostrar Todos os Dados (Histórico Completo)", type="primary"):
                     with st.spinner("Carregando todos os dados..."):
                         # Get all data regardless of date
-                        all_publications, all_executions, all_analyses = get_dashboard_data(
-                            "01/01/2020", "31/12/2030", None
+                        all_aggregates = get_dashboard_data(
+                            "01/01/2020", "31/12/2030", ()
                         )
                     
-                    if all_publications:
-                        st.success(f"📊 Exibindo TODOS os dados • {len(all_publications)} publicações encontradas")
+                    all_total = _total_publications(all_aggregates)
+                    if all_total:
+                        st.success(f"📊 Exibindo TODOS os dados • {all_total} publicações encontradas")
                         
                         # KPI Cards Section
                         st.markdown("### 📈 Indicadores Principais (Histórico Completo)")
-                        create_kpi_cards(all_publications, all_executions, all_analyses)
+                        create_kpi_cards(all_aggregates['kpis'])
                         
                         st.markdown("---")
                         
                         # Charts Grid
                         st.markdown("### 📊 Análises Visuais (Todos os Dados)")
                         
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            create_publications_timeline_chart(all_publications)
-                        with col2:
-                            create_tribunals_chart(all_publications)
-                        
-                        col3, col4 = st.columns(2)
-                        with col3:
-                            create_communication_types_pie(all_publications)
-                        with col4:
-                            create_process_classes_chart(all_publications)
+                        st.plotly_chart(create_dashboard_figure(all_aggregates), use_container_width=True)
     
     # Collapsible Filters Section
     st.markdown("---")
@@ -338,7 +330,7 @@ def main():
             )
         
         # Tribunal filter
-        all_tribunals = db.get_available_tribunals()
+        all_tribunals = _available_tribunals()
         
         selected_tribunals = st.multiselect(
             "🏛️ Tribunais:",
@@ -353,30 +345,21 @@ def main():
             filter_end_str = filter_end_date.strftime('%d/%m/%Y')
             
             with st.spinner("Aplicando filtros..."):
-                filtered_publications, filtered_executions, filtered_analyses = get_dashboard_data(
-                    filter_start_str, filter_end_str, selected_tribunals
+                filtered_aggregates = get_dashboard_data(
+                    filter_start_str, filter_end_str, _tribunal_filter(selected_tribunals)
                 )
             
-            if filtered_publications:
-                st.success(f"📊 Filtros aplicados: {filter_start_str} a {filter_end_str} • {len(filtered_publications)} publicações")
+            filtered_total = _total_publications(filtered_aggregates)
+            if filtered_total:
+                st.success(f"📊 Filtros aplicados: {filter_start_str} a {filter_end_str} • {filtered_total} publicações")
                 
                 # Update charts with filtered data
                 st.markdown("### 📈 Indicadores Filtrados")
-                create_kpi_cards(filtered_publications, filtered_executions, filtered_analyses)
+                create_kpi_cards(filtered_aggregates['kpis'])
                 
                 st.markdown("### 📊 Análises Filtradas")
                 
-                col1, col2 = st.columns(2)
-                with col1:
-                    create_publications_timeline_chart(filtered_publications)
-                with col2:
-                    create_tribunals_chart(filtered_publications)
-                
-                col3, col4 = st.columns(2)
-                with col3:
-                    create_communication_types_pie(filtered_publications)
-                with col4:
-                    create_process_classes_chart(filtered_publications)
+                st.plotly_chart(create_dashboard_figure(filtered_aggregates), use_container_width=True)
             else:
                 st.warning(f"⚠️ Nenhuma publicação encontrada no período filtrado: {filter_start_str} a {filter_end_str}")
     
@@ -4,15 +4,246 @@ Handles all database operations for search results and publications
 """
 
 import sqlite3
-import json
+import contextlib
 import logging
+import re
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 import os
+import queue
+import urllib.parse
+import orjson
+
+if TYPE_CHECKING:
+    import pandas as pd  # Only imported inside get_dashboard_aggregates at runtime
+
+# Bound parameters per statement on SQLite builds older than 3.32
+_SQLITE_MAX_PARAMS = 999
+
+# Whole schema, run as one script (and one transaction) by init_database
+_SCHEMA_SQL = """
+BEGIN;
+
+-- Search executions table
+CREATE TABLE IF NOT EXISTS search_executions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    date DATE NOT NULL,
+    timestamp DATETIME NOT NULL,
+    rules_executed INTEGER,
+    publications_found INTEGER,
+    stats TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(name, date)
+);
+
+-- Publications table with all API fields
+CREATE TABLE IF NOT EXISTS publications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    search_execution_id INTEGER,
+    date DATE,  -- Copy of search_executions.date, so per-day reads skip the join
+    api_id INTEGER,
+    data_disponibilizacao VARCHAR(50),
+    sigla_tribunal VARCHAR(20),
+    tipo_comunicacao VARCHAR(100),
+    nome_orgao VARCHAR(200),
+    texto TEXT,
+    numero_processo VARCHAR(50),
+    numeroprocessocommascara VARCHAR(50),
+    meio VARCHAR(100),
+    link VARCHAR(500),
+    tipo_documento VARCHAR(100),
+    nome_classe VARCHAR(100),
+    codigo_classe VARCHAR(20),
+    numero_comunicacao INTEGER,
+    ativo BOOLEAN,
+    hash BLOB,  -- Hex digests are stored as raw bytes, anything else as text
+    datadisponibilizacao VARCHAR(50),
+    meio_completo VARCHAR(200),
+    source_rule VARCHAR(100),
+    raw_data TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (search_execution_id) REFERENCES search_executions(id) ON DELETE CASCADE
+);
+
+-- Destinatarios table
+CREATE TABLE IF NOT EXISTS destinatarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    publication_id INTEGER,
+    nome VARCHAR(200),
+    polo VARCHAR(100),
+    comunicacao_id INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (publication_id) REFERENCES publications(id) ON DELETE CASCADE
+);
+
+-- Advogados table
+CREATE TABLE IF NOT EXISTS advogados (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    advogado_id INTEGER,
+    nome VARCHAR(200),
+    numero_oab VARCHAR(20),
+    uf_oab VARCHAR(2),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(advogado_id)
+);
+
+-- Publication-Advogados relationship table
+CREATE TABLE IF NOT EXISTS publication_advogados (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    publication_id INTEGER,
+    advogado_id INTEGER,
+    comunicacao_id INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (publication_id) REFERENCES publications(id) ON DELETE CASCADE,
+    FOREIGN KEY (advogado_id) REFERENCES advogados(id) ON DELETE CASCADE
+);
+
+-- Análises Inteligentes table
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    publication_id INTEGER,
+    filename VARCHAR(200),
+    original_filename VARCHAR(200),
+    html_content TEXT,
+    upload_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    uploaded_by VARCHAR(50),
+    FOREIGN KEY (publication_id) REFERENCES publications(id) ON DELETE CASCADE
+);
+
+-- Create indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_search_executions_date ON search_executions(date);
+CREATE INDEX IF NOT EXISTS idx_publications_hash ON publications(hash);
+-- Also serves the per-execution listings ordered by process number
+CREATE INDEX IF NOT EXISTS idx_publications_search_numproc ON publications(search_execution_id, numeroprocessocommascara);
+DROP INDEX IF EXISTS idx_publications_search_exec;  -- Prefix of the index above
+CREATE INDEX IF NOT EXISTS idx_publications_date ON publications(datadisponibilizacao);
+CREATE INDEX IF NOT EXISTS idx_publications_date_sort ON publications(date, numeroprocessocommascara);
+CREATE INDEX IF NOT EXISTS idx_publications_tribunal ON publications(sigla_tribunal);
+CREATE INDEX IF NOT EXISTS idx_destinatarios_pub ON destinatarios(publication_id);
+CREATE INDEX IF NOT EXISTS idx_advogados_oab ON advogados(numero_oab, uf_oab);
+CREATE INDEX IF NOT EXISTS idx_publication_advogados_pub ON publication_advogados(publication_id, advogado_id);
+CREATE INDEX IF NOT EXISTS idx_publication_advogados_adv ON publication_advogados(advogado_id);
+-- Latest analysis of a publication without a sort
+CREATE INDEX IF NOT EXISTS idx_analyses_pub_upload ON analyses(publication_id, upload_date DESC);
+DROP INDEX IF EXISTS idx_analyses_pub;  -- Prefix of the index above
+
+COMMIT;
+"""
+
+# Statements run once per publication or per batch. Keeping them as constants means every call
+# hits the same entry in the connection's prepared-statement cache
+_SQL_UPSERT_ADVOGADO = """
+    INSERT INTO advogados (advogado_id, nome, numero_oab, uf_oab)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(advogado_id) DO UPDATE SET
+        nome = excluded.nome, numero_oab = excluded.numero_oab, uf_oab = excluded.uf_oab
+"""
+
+# API keys copied as-is into publications columns, as (API key, column) pairs.
+# _insert_publications binds the values in this same order
+_PUBLICATION_FIELDS = (
+    ('id', 'api_id'),
+    ('data_disponibilizacao', 'data_disponibilizacao'),
+    ('siglaTribunal', 'sigla_tribunal'),
+    ('tipoComunicacao', 'tipo_comunicacao'),
+    ('nomeOrgao', 'nome_orgao'),
+    ('texto', 'texto'),
+    ('numero_processo', 'numero_processo'),
+    ('numeroprocessocommascara', 'numeroprocessocommascara'),
+    ('meio', 'meio'),
+    ('link', 'link'),
+    ('tipoDocumento', 'tipo_documento'),
+    ('nomeClasse', 'nome_classe'),
+    ('codigoClasse', 'codigo_classe'),
+    ('numeroComunicacao', 'numero_comunicacao'),
+    ('ativo', 'ativo'),
+    ('datadisponibilizacao', 'datadisponibilizacao'),
+    ('meiocompleto', 'meio_completo'),
+    ('_source_rule', 'source_rule'),
+)
+
+# API keys stored in their own publications columns or child tables; anything else goes to raw_data
+_PUBLICATION_API_KEYS = frozenset(key for key, _ in _PUBLICATION_FIELDS) | {'hash', 'destinatarios', 'destinatarioadvogados'}
+
+# Publication columns the readers map back to API fields (raw_data and created_at are never needed)
+_PUBLICATION_COLUMNS = """
+    p.id, p.api_id, p.data_disponibilizacao, p.sigla_tribunal, p.tipo_comunicacao, p.nome_orgao,
+    p.texto, p.numero_processo, p.numeroprocessocommascara, p.meio, p.link, p.tipo_documento,
+    p.nome_classe, p.codigo_classe, p.numero_comunicacao, p.ativo,
+    CASE WHEN typeof(p.hash) = 'blob' THEN lower(hex(p.hash)) ELSE p.hash END AS hash,
+    p.datadisponibilizacao, p.meio_completo, p.source_rule
+"""
+
+# Lowercase hex digests (MD5 up to SHA-512) round-trip exactly through bytes.fromhex()/.hex()
+_HEX_DIGEST = re.compile(r'(?:[0-9a-f]{2}){16,64}')
+
+# Child rows of publication p, assembled into JSON arrays by SQLite in the same query as the publication
+_DESTINATARIOS_JSON = """
+    (SELECT json_group_array(json_object('nome', d.nome, 'polo', d.polo, 'comunicacao_id', d.comunicacao_id))
+     FROM destinatarios d WHERE d.publication_id = p.id) AS destinatarios_json
+"""
+_ADVOGADOS_JSON = """
+    (SELECT json_group_array(json_object(
+         'comunicacao_id', pa.comunicacao_id,
+         'advogado_id', a.advogado_id,
+         'advogado', json_object('id', a.advogado_id, 'nome', a.nome,
+                                 'numero_oab', a.numero_oab, 'uf_oab', a.uf_oab)))
+     FROM publication_advogados pa
+     JOIN advogados a ON a.advogado_id = pa.advogado_id
+     WHERE pa.publication_id = p.id) AS advogados_json
+"""
+
+def _insert_rows(conn: sqlite3.Connection, table: str, columns: Tuple[str, ...], rows: List[tuple]):
+    """Insert rows with multi-row VALUES statements as large as the parameter limit allows.
+    Rows left over after the last full chunk go through a single-row executemany, so only two
+    statement shapes per table ever reach the statement cache."""
+    placeholders = '(' + ', '.join('?' * len(columns)) + ')'
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    chunk_size = _SQLITE_MAX_PARAMS // len(columns)
+    
+    full = len(rows) - len(rows) % chunk_size
+    if full:
+        chunk_sql = insert + ', '.join([placeholders] * chunk_size)
+        for start in range(0, full, chunk_size):
+            conn.execute(chunk_sql, [value for row in rows[start:start + chunk_size] for value in row])
+    if full < len(rows):
+        conn.executemany(insert + placeholders, rows[full:])
+
+def json_dumps(data: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON. Non-string dict keys are stringified, as json.dumps would"""
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    return orjson.dumps(data, option=option)
+
+def json_loads(data) -> Any:
+    """Parse JSON from text or a bytes-like object"""
+    return orjson.loads(data)
+
+def _hash_value(value: Any) -> Any:
+    """Storage form of a publication hash: raw bytes for a hex digest (half the size), else unchanged"""
+    if isinstance(value, str) and _HEX_DIGEST.fullmatch(value):
+        return bytes.fromhex(value)
+    return value
+
+def _extra_fields_json(pub: Dict) -> Optional[str]:
+    """JSON of the publication keys that have no column of their own, or None when there are none"""
+    extras = {key: value for key, value in pub.items() if key not in _PUBLICATION_API_KEYS}
+    return json_dumps(extras).decode('utf-8') if extras else None
 
 class DatabaseManager:
+    # Shared by every manager in the process so writers queue up here instead of on SQLite's lock
+    _write_lock = threading.Lock()
+    # Database files whose schema setup already ran in this process
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+    
     def __init__(self, db_path: str = "data/legallexmvp2.db"):
         self.db_path = db_path
+        # One write connection, used under _write_lock, plus a pool of read-only connections so
+        # reads from any thread (Streamlit runs each rerun on a new one) proceed in parallel under WAL
+        self._conn = None
+        self._readers = queue.SimpleQueue()
         # Ensure data directory exists
         try:
             os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -22,699 +253,678 @@ class DatabaseManager:
             # Fallback to current directory
             self.db_path = "legallexmvp2.db"
             logging.info(f"Using fallback database path: {os.path.abspath(self.db_path)}")
-        self.init_database()
+        # Schema script, migrations and ANALYZE only need to run once per file, not per manager
+        with self._init_lock:
+            db_key = os.path.abspath(self.db_path)
+            if db_key not in self._initialized_paths:
+                self.init_database()
+                self._initialized_paths.add(db_key)
     
     def get_connection(self):
-        """Get database connection with foreign key support"""
-        conn = sqlite3.connect(self.db_path)
-        # Temporarily disable foreign keys to debug
-        # conn.execute("PRAGMA foreign_keys = ON")
+        """Get the manager's write connection, opened once in autocommit mode and reused.
+        Callers must hold _write_lock while they use it"""
+        conn = self._conn
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                   cached_statements=256)
+            # Wider pages keep the B-trees of the wide publications rows shallower. This only takes
+            # effect on a new, empty database and has to come before the switch to WAL
+            conn.execute("PRAGMA page_size=8192")
+            # WAL lets readers run alongside the writer; it is stored in the file, so only switch once.
+            # synchronous=NORMAL can lose the last commits on power loss (not on a process crash),
+            # which is acceptable for search results since a search can be re-run. Uploaded analyses
+            # can't be, so save_analysis switches to FULL for its own commit
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal':
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+            conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+            conn.row_factory = sqlite3.Row
+            # Temporarily disable foreign keys to debug
+            # conn.execute("PRAGMA foreign_keys = ON")
+            self._conn = conn
         return conn
     
+    @contextlib.contextmanager
+    def _reader(self):
+        """Borrow a read-only connection from the pool, opening a new one when all are in use"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            uri = f"file:{urllib.parse.quote(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None,
+                                   cached_statements=256)
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+            conn.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+            conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
     def init_database(self):
         """Initialize database with all required tables"""
         conn = self.get_connection()
         try:
-            # Search executions table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS search_executions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name VARCHAR(100) NOT NULL,
-                    date DATE NOT NULL,
-                    timestamp DATETIME NOT NULL,
-                    rules_executed INTEGER,
-                    publications_found INTEGER,
-                    stats TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(name, date)
-                )
-            """)
-            
-            # Publications table with all API fields
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS publications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    search_execution_id INTEGER,
-                    api_id INTEGER,
-                    data_disponibilizacao VARCHAR(50),
-                    sigla_tribunal VARCHAR(20),
-                    tipo_comunicacao VARCHAR(100),
-                    nome_orgao VARCHAR(200),
-                    texto TEXT,
-                    numero_processo VARCHAR(50),
-                    numeroprocessocommascara VARCHAR(50),
-                    meio VARCHAR(100),
-                    link VARCHAR(500),
-                    tipo_documento VARCHAR(100),
-                    nome_classe VARCHAR(100),
-                    codigo_classe VARCHAR(20),
-                    numero_comunicacao INTEGER,
-                    ativo BOOLEAN,
-                    hash VARCHAR(100),
-                    datadisponibilizacao VARCHAR(50),
-                    meio_completo VARCHAR(200),
-                    source_rule VARCHAR(100),
-                    raw_data TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (search_execution_id) REFERENCES search_executions(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Destinatarios table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS destinatarios (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    publication_id INTEGER,
-                    nome VARCHAR(200),
-                    polo VARCHAR(100),
-                    comunicacao_id INTEGER,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (publication_id) REFERENCES publications(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Advogados table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS advogados (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    advogado_id INTEGER,
-                    nome VARCHAR(200),
-                    numero_oab VARCHAR(20),
-                    uf_oab VARCHAR(2),
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(advogado_id)
-                )
-            """)
-            
-            # Publication-Advogados relationship table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS publication_advogados (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    publication_id INTEGER,
-                    advogado_id INTEGER,
-                    comunicacao_id INTEGER,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (publication_id) REFERENCES publications(id) ON DELETE CASCADE,
-                    FOREIGN KEY (advogado_id) REFERENCES advogados(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Análises Inteligentes table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS analyses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    publication_id INTEGER,
-                    filename VARCHAR(200),
-                    original_filename VARCHAR(200),
-                    html_content TEXT,
-                    upload_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    uploaded_by VARCHAR(50),
-                    FOREIGN KEY (publication_id) REFERENCES publications(id) ON DELETE CASCADE
-                )
-            """)
+            # Databases created before publications.date existed get the column (filled from their
+            # search executions) before the schema script indexes it
+            pub_columns = {row['name'] for row in conn.execute("PRAGMA table_info(publications)")}
+            if pub_columns and 'date' not in pub_columns:
+                conn.executescript("""
+                    BEGIN;
+                    ALTER TABLE publications ADD COLUMN date DATE;
+                    UPDATE publications SET date = (
+                        SELECT se.date FROM search_executions se WHERE se.id = publications.search_execution_id
+                    );
+                    COMMIT;
+                """)
+            
+            conn.executescript(_SCHEMA_SQL)
+            
+            # One-time rewrite of hex hashes saved as text before they were stored as bytes
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                conn.execute("BEGIN")
+                conn.executemany("UPDATE publications SET hash = ? WHERE id = ?", [
+                    (bytes.fromhex(row['hash']), row['id'])
+                    for row in conn.execute("SELECT id, hash FROM publications WHERE typeof(hash) = 'text'")
+                    if _HEX_DIGEST.fullmatch(row['hash'])
+                ])
+                conn.execute("PRAGMA user_version = 1")
+                conn.commit()
+            
+            # Give the planner statistics for the indexes: a full ANALYZE the first time,
+            # afterwards PRAGMA optimize only re-analyzes tables whose stats look stale
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            ).fetchone()
+            conn.execute("PRAGMA optimize" if has_stats else "ANALYZE")
             
-            # Create indexes for better performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_executions_date ON search_executions(date)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_publications_hash ON publications(hash)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_publications_search_exec ON publications(search_execution_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_publications_date ON publications(datadisponibilizacao)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_destinatarios_pub ON destinatarios(publication_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_advogados_oab ON advogados(numero_oab, uf_oab)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_pub ON analyses(publication_id)")
-            
-            conn.commit()
             logging.info("Database initialized successfully")
             
         except Exception as e:
             logging.error(f"Error initializing database: {str(e)}")
             conn.rollback()
             raise
-        finally:
-            conn.close()
     
     def save_search_execution(self, name: str, date: str, timestamp: datetime, 
                             rules_executed: int, publications: List[Dict], stats: Dict) -> int:
         """Save a complete search execution with all publications"""
-        conn = self.get_connection()
-        try:
-            logging.info(f"Saving search execution: name={name}, date={date}, pubs={len(publications)}")
-            
-            # Insert or update search execution
-            cursor = conn.execute("""
-                INSERT OR REPLACE INTO search_executions 
-                (name, date, timestamp, rules_executed, publications_found, stats)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (name, date, timestamp.isoformat(), rules_executed, len(publications), json.dumps(stats)))
-            
-            search_execution_id = cursor.lastrowid
-            logging.info(f"Search execution saved with ID: {search_execution_id}")
-            
-            # Delete existing publications for this search execution
-            conn.execute("DELETE FROM publications WHERE search_execution_id = ?", (search_execution_id,))
-            
-            # Insert all publications
-            logging.info(f"Inserting {len(publications)} publications")
-            for i, pub in enumerate(publications):
-                try:
-                    pub_id = self._insert_publication(conn, search_execution_id, pub)
-                    logging.info(f"Inserted publication {i+1}/{len(publications)} with ID {pub_id}")
-                    self._insert_destinatarios(conn, pub_id, pub.get('destinatarios', []))
-                    self._insert_advogados(conn, pub_id, pub.get('destinatarioadvogados', []))
-                except Exception as e:
-                    logging.error(f"Error inserting publication {i+1}: {str(e)}")
-                    raise
-            
-            conn.commit()
-            logging.info(f"Saved search execution '{name}' with {len(publications)} publications")
-            return search_execution_id
-            
-        except Exception as e:
-            logging.error(f"Error saving search execution: {str(e)}")
-            conn.rollback()
-            raise
-        finally:
-            conn.close()
+        with self._write_lock:
+            conn = self.get_connection()
+            try:
+                logging.debug(f"Saving search execution: name={name}, date={date}, pubs={len(publications)}")
+                # One transaction for the whole batch; IMMEDIATE takes the write lock up front so the
+                # first insert can't fail with SQLITE_BUSY after reads have already started it
+                conn.execute("BEGIN IMMEDIATE")
+                
+                # Insert or update search execution; a re-run of the same (name, date) keeps its id
+                search_execution_id = conn.execute("""
+                    INSERT INTO search_executions 
+                    (name, date, timestamp, rules_executed, publications_found, stats)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(name, date) DO UPDATE SET
+                        timestamp = excluded.timestamp, rules_executed = excluded.rules_executed,
+                        publications_found = excluded.publications_found, stats = excluded.stats
+                    RETURNING id
+                """, (name, date, timestamp.isoformat(), rules_executed, len(publications), json_dumps(stats).decode('utf-8'))).fetchone()[0]
+                logging.debug(f"Search execution saved with ID: {search_execution_id}")
+                
+                # Uploaded analyses outlive a re-run: remember which publication each one belongs to,
+                # so it can be linked to the re-inserted copy below
+                previous_analyses = conn.execute("""
+                    SELECT a.id, p.api_id, p.hash
+                    FROM analyses a
+                    JOIN publications p ON p.id = a.publication_id
+                    WHERE p.search_execution_id = ?
+                """, (search_execution_id,)).fetchall()
+                
+                # Delete the publications of a previous run of this search execution. Foreign keys are
+                # off, so remove their destinatarios and advogado links first
+                previous_pubs = "SELECT id FROM publications WHERE search_execution_id = ?"
+                for child_table in ('destinatarios', 'publication_advogados'):
+                    conn.execute(f"DELETE FROM {child_table} WHERE publication_id IN ({previous_pubs})",
+                                 (search_execution_id,))
+                conn.execute("DELETE FROM publications WHERE search_execution_id = ?", (search_execution_id,))
+                
+                # Insert all publications, then their destinatarios and advogados, one batch each
+                pub_ids = self._insert_publications(conn, search_execution_id, date, publications)
+                self._insert_destinatarios(conn, pub_ids, publications)
+                self._insert_advogados(conn, pub_ids, publications)
+                if previous_analyses:
+                    self._relink_analyses(conn, previous_analyses, pub_ids, publications)
+                
+                conn.commit()
+                logging.info(f"Saved search execution '{name}' (ID {search_execution_id}) with {len(publications)} publications")
+                return search_execution_id
+                
+            except Exception as e:
+                logging.error(f"Error saving search execution: {str(e)}")
+                conn.rollback()
+                raise
+    
+    def _relink_analyses(self, conn: sqlite3.Connection, previous_analyses: List[sqlite3.Row],
+                         publication_ids: List[int], publications: List[Dict]):
+        """Point analyses of replaced publications at the new rows with the same hash (or API id).
+        Analyses whose publication is no longer returned are kept, just unlinked as before."""
+        by_hash = {}
+        by_api_id = {}
+        for publication_id, pub in zip(publication_ids, publications):
+            if pub.get('hash') is not None:
+                by_hash.setdefault(_hash_value(pub['hash']), publication_id)
+            if pub.get('id') is not None:
+                by_api_id.setdefault(pub['id'], publication_id)
+        
+        relinked = []
+        for analysis in previous_analyses:
+            publication_id = by_hash.get(analysis['hash']) if analysis['hash'] is not None else None
+            if publication_id is None and analysis['api_id'] is not None:
+                publication_id = by_api_id.get(analysis['api_id'])
+            if publication_id is not None:
+                relinked.append((publication_id, analysis['id']))
+        
+        conn.executemany("UPDATE analyses SET publication_id = ? WHERE id = ?", relinked)
+        if len(relinked) < len(previous_analyses):
+            logging.warning(f"{len(previous_analyses) - len(relinked)} analyses have no matching publication in the new run")
     
-    def _insert_publication(self, conn: sqlite3.Connection, search_execution_id: int, pub: Dict) -> int:
-        """Insert a single publication"""
-        cursor = conn.execute("""
-            INSERT INTO publications (
-                search_execution_id, api_id, data_disponibilizacao, sigla_tribunal,
-                tipo_comunicacao, nome_orgao, texto, numero_processo, numeroprocessocommascara,
-                meio, link, tipo_documento, nome_classe, codigo_classe, numero_comunicacao,
-                ativo, hash, datadisponibilizacao, meio_completo, source_rule, raw_data
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            search_execution_id,
-            pub.get('id'),
-            pub.get('data_disponibilizacao'),
-            pub.get('siglaTribunal'),
-            pub.get('tipoComunicacao'),
-            pub.get('nomeOrgao'),
-            pub.get('texto'),
-            pub.get('numero_processo'),
-            pub.get('numeroprocessocommascara'),
-            pub.get('meio'),
-            pub.get('link'),
-            pub.get('tipoDocumento'),
-            pub.get('nomeClasse'),
-            pub.get('codigoClasse'),
-            pub.get('numeroComunicacao'),
-            pub.get('ativo'),
-            pub.get('hash'),
-            pub.get('datadisponibilizacao'),
-            pub.get('meiocompleto'),
-            pub.get('_source_rule'),
-            json.dumps(pub)  # Store full JSON as backup
-        ))
-        return cursor.lastrowid
+    def _insert_publications(self, conn: sqlite3.Connection, search_execution_id: int, date: str,
+                             publications: List[Dict]) -> List[int]:
+        """Insert all publications of a search execution, returning their ids in input order"""
+        _insert_rows(conn, 'publications', (
+            'search_execution_id', 'date', *(column for _, column in _PUBLICATION_FIELDS), 'hash', 'raw_data'
+        ), [
+            (
+                search_execution_id,
+                date,
+                # Same order as _PUBLICATION_FIELDS
+                pub.get('id'),
+                pub.get('data_disponibilizacao'),
+                pub.get('siglaTribunal'),
+                pub.get('tipoComunicacao'),
+                pub.get('nomeOrgao'),
+                pub.get('texto'),
+                pub.get('numero_processo'),
+                pub.get('numeroprocessocommascara'),
+                pub.get('meio'),
+                pub.get('link'),
+                pub.get('tipoDocumento'),
+                pub.get('nomeClasse'),
+                pub.get('codigoClasse'),
+                pub.get('numeroComunicacao'),
+                pub.get('ativo'),
+                pub.get('datadisponibilizacao'),
+                pub.get('meiocompleto'),
+                pub.get('_source_rule'),
+                _hash_value(pub.get('hash')),
+                _extra_fields_json(pub)  # Only keys not covered by the columns above
+            )
+            for pub in publications
+        ])
+        
+        # The execution's old publications were deleted in this transaction and ids only grow,
+        # so reading them back by id gives the insertion order
+        cursor = conn.execute(
+            "SELECT id FROM publications WHERE search_execution_id = ? ORDER BY id", (search_execution_id,)
+        )
+        return [row[0] for row in cursor]
     
-    def _insert_destinatarios(self, conn: sqlite3.Connection, publication_id: int, destinatarios: List[Dict]):
-        """Insert destinatarios for a publication"""
-        for dest in destinatarios:
-            conn.execute("""
-                INSERT INTO destinatarios (publication_id, nome, polo, comunicacao_id)
-                VALUES (?, ?, ?, ?)
-            """, (publication_id, dest.get('nome'), dest.get('polo'), dest.get('comunicacao_id')))
+    def _insert_destinatarios(self, conn: sqlite3.Connection, publication_ids: List[int], publications: List[Dict]):
+        """Insert the destinatarios of every publication"""
+        _insert_rows(conn, 'destinatarios', ('publication_id', 'nome', 'polo', 'comunicacao_id'), [
+            (publication_id, dest.get('nome'), dest.get('polo'), dest.get('comunicacao_id'))
+            for publication_id, pub in zip(publication_ids, publications)
+            for dest in pub.get('destinatarios', [])
+        ])
     
-    def _insert_advogados(self, conn: sqlite3.Connection, publication_id: int, advogados_data: List[Dict]):
+    def _insert_advogados(self, conn: sqlite3.Connection, publication_ids: List[int], publications: List[Dict]):
         """Insert advogados and their relationship to publications"""
-        for adv_data in advogados_data:
-            advogado_info = adv_data.get('advogado', {})
-            advogado_id = advogado_info.get('id')
-            
-            if advogado_id:
-                # Insert or update advogado
-                conn.execute("""
-                    INSERT OR REPLACE INTO advogados (advogado_id, nome, numero_oab, uf_oab)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    advogado_id,
-                    advogado_info.get('nome'),
-                    advogado_info.get('numero_oab'),
-                    advogado_info.get('uf_oab')
-                ))
-                
-                # Insert publication-advogado relationship
-                conn.execute("""
-                    INSERT INTO publication_advogados (publication_id, advogado_id, comunicacao_id)
-                    VALUES (?, ?, ?)
-                """, (publication_id, advogado_id, adv_data.get('comunicacao_id')))
+        advogados = {}  # One row per advogado across the batch; the last occurrence wins
+        relationships = []
+        for publication_id, pub in zip(publication_ids, publications):
+            for adv_data in pub.get('destinatarioadvogados', []):
+                advogado_info = adv_data.get('advogado', {})
+                advogado_id = advogado_info.get('id')
+                
+                if advogado_id:
+                    advogados[advogado_id] = (
+                        advogado_id,
+                        advogado_info.get('nome'),
+                        advogado_info.get('numero_oab'),
+                        advogado_info.get('uf_oab')
+                    )
+                    relationships.append((publication_id, advogado_id, adv_data.get('comunicacao_id')))
+        
+        if not advogados:
+            return
+        
+        # Insert or update advogados in place (unlike REPLACE, an existing row keeps its id)
+        conn.executemany(_SQL_UPSERT_ADVOGADO, advogados.values())
+        
+        # Insert publication-advogado relationships
+        _insert_rows(conn, 'publication_advogados', ('publication_id', 'advogado_id', 'comunicacao_id'), relationships)
     
     def get_search_execution_by_date(self, date: str) -> Optional[Dict]:
         """Get search execution by date"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT * FROM search_executions WHERE date = ? ORDER BY timestamp DESC LIMIT 1
-            """, (date,))
-            
-            row = cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
-            return None
-            
-        except Exception as e:
-            logging.error(f"Error getting search execution by date: {str(e)}")
-            return None
-        finally:
-            conn.close()
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT * FROM search_executions WHERE date = ? ORDER BY timestamp DESC LIMIT 1
+                """, (date,))
+                
+                row = cursor.fetchone()
+                if row:
+                    return dict(row)
+                return None
+                
+            except Exception as e:
+                logging.error(f"Error getting search execution by date: {str(e)}")
+                return None
     
-    def get_publications_by_search_execution(self, search_execution_id: int) -> List[Dict]:
-        """Get all publications for a search execution with destinatarios and advogados"""
-        conn = self.get_connection()
-        try:
-            # Get publications
-            cursor = conn.execute("""
-                SELECT * FROM publications WHERE search_execution_id = ?
-            """, (search_execution_id,))
-            
-            publications = []
-            columns = [desc[0] for desc in cursor.description]
-            
-            for row in cursor.fetchall():
-                pub = dict(zip(columns, row))
-                
-                # Get destinatarios
-                dest_cursor = conn.execute("""
-                    SELECT nome, polo, comunicacao_id FROM destinatarios WHERE publication_id = ?
-                """, (pub['id'],))
-                pub['destinatarios'] = [
-                    {'nome': row[0], 'polo': row[1], 'comunicacao_id': row[2]}
-                    for row in dest_cursor.fetchall()
-                ]
-                
-                # Get advogados
-                adv_cursor = conn.execute("""
-                    SELECT a.advogado_id, a.nome, a.numero_oab, a.uf_oab, pa.comunicacao_id
-                    FROM advogados a
-                    JOIN publication_advogados pa ON a.advogado_id = pa.advogado_id
-                    WHERE pa.publication_id = ?
-                """, (pub['id'],))
-                pub['destinatarioadvogados'] = [
-                    {
-                        'comunicacao_id': row[4],
-                        'advogado_id': row[0],
-                        'advogado': {
-                            'id': row[0],
-                            'nome': row[1],
-                            'numero_oab': row[2],
-                            'uf_oab': row[3]
-                        }
+    def get_publications_by_search_execution(self, search_execution_id: int, limit: Optional[int] = None,
+                                             offset: int = 0) -> List[Dict]:
+        """Get publications for a search execution with destinatarios and advogados.
+        When limit is given only that page of publications (ordered by id) is loaded."""
+        with self._reader() as conn:
+            try:
+                # Get publications together with their destinatarios and advogados
+                query = f"""
+                    SELECT {_PUBLICATION_COLUMNS}, {_DESTINATARIOS_JSON}, {_ADVOGADOS_JSON}
+                    FROM publications p
+                    WHERE p.search_execution_id = ?
+                    ORDER BY p.id
+                """
+                params = [search_execution_id]
+                if limit is not None:
+                    query += " LIMIT ? OFFSET ?"
+                    params.extend([limit, offset])
+                
+                publications = []
+                for pub in conn.execute(query, params):
+                    # Map database field names back to API field names for compatibility
+                    api_pub = {
+                        'id': pub['api_id'],
+                        'data_disponibilizacao': pub['data_disponibilizacao'],
+                        'siglaTribunal': pub['sigla_tribunal'],
+                        'tipoComunicacao': pub['tipo_comunicacao'],
+                        'nomeOrgao': pub['nome_orgao'],
+                        'texto': pub['texto'],
+                        'numero_processo': pub['numero_processo'],
+                        'numeroprocessocommascara': pub['numeroprocessocommascara'],
+                        'meio': pub['meio'],
+                        'link': pub['link'],
+                        'tipoDocumento': pub['tipo_documento'],
+                        'nomeClasse': pub['nome_classe'],
+                        'codigoClasse': pub['codigo_classe'],
+                        'numeroComunicacao': pub['numero_comunicacao'],
+                        'ativo': pub['ativo'],
+                        'hash': pub['hash'],
+                        'datadisponibilizacao': pub['datadisponibilizacao'],
+                        'meiocompleto': pub['meio_completo'],
+                        '_source_rule': pub['source_rule'],
+                        '_db_id': pub['id'],  # Include database ID for analysis linking
+                        'destinatarios': json_loads(pub['destinatarios_json']),
+                        'destinatarioadvogados': json_loads(pub['advogados_json'])
                     }
-                    for row in adv_cursor.fetchall()
-                ]
-                
-                # Map database field names back to API field names for compatibility
-                api_pub = {
-                    'id': pub['api_id'],
-                    'data_disponibilizacao': pub['data_disponibilizacao'],
-                    'siglaTribunal': pub['sigla_tribunal'],
-                    'tipoComunicacao': pub['tipo_comunicacao'],
-                    'nomeOrgao': pub['nome_orgao'],
-                    'texto': pub['texto'],
-                    'numero_processo': pub['numero_processo'],
-                    'numeroprocessocommascara': pub['numeroprocessocommascara'],
-                    'meio': pub['meio'],
-                    'link': pub['link'],
-                    'tipoDocumento': pub['tipo_documento'],
-                    'nomeClasse': pub['nome_classe'],
-                    'codigoClasse': pub['codigo_classe'],
-                    'numeroComunicacao': pub['numero_comunicacao'],
-                    'ativo': pub['ativo'],
-                    'hash': pub['hash'],
-                    'datadisponibilizacao': pub['datadisponibilizacao'],
-                    'meiocompleto': pub['meio_completo'],
-                    '_source_rule': pub['source_rule'],
-                    '_db_id': pub['id'],  # Include database ID for analysis linking
-                    'destinatarios': pub['destinatarios'],
-                    'destinatarioadvogados': pub['destinatarioadvogados']
-                }
+                    
+                    publications.append(api_pub)
                 
-                publications.append(api_pub)
-            
-            return publications
-            
-        except Exception as e:
-            logging.error(f"Error getting publications by search execution: {str(e)}")
-            return []
-        finally:
-            conn.close()
+                return publications
+                
+            except Exception as e:
+                logging.error(f"Error getting publications by search execution: {str(e)}")
+                return []
     
-    def get_publications_by_date(self, date: str) -> List[Dict]:
-        """Get all publications for a specific date"""
+    def get_publications_by_date(self, date: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Get publications for a specific date (all of them, or one page when limit is given)"""
         search_execution = self.get_search_execution_by_date(date)
         if search_execution:
-            return self.get_publications_by_search_execution(search_execution['id'])
+            return self.get_publications_by_search_execution(search_execution['id'], limit, offset)
         return []
     
+    def count_publications_by_date(self, date: str) -> int:
+        """Count publications of the latest search execution for a specific date"""
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT COUNT(*) FROM publications
+                    WHERE search_execution_id = (
+                        SELECT id FROM search_executions WHERE date = ? ORDER BY timestamp DESC LIMIT 1
+                    )
+                """, (date,))
+                return cursor.fetchone()[0]
+                
+            except Exception as e:
+                logging.error(f"Error counting publications by date: {str(e)}")
+                return 0
+    
     def get_publications_with_analyses_by_date(self, date: str) -> List[Dict]:
         """Get publications that have analyses for a specific date"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT p.*, a.id as analysis_id, a.filename, a.original_filename, 
-                       a.html_content, a.upload_date, a.uploaded_by,
-                       se.date
-                FROM publications p
-                JOIN search_executions se ON p.search_execution_id = se.id
-                JOIN analyses a ON p.id = a.publication_id
-                WHERE se.date = ?
-                ORDER BY p.numeroprocessocommascara
-            """, (date,))
-            
-            publications_with_analyses = []
-            columns = [desc[0] for desc in cursor.description]
-            
-            for row in cursor.fetchall():
-                data = dict(zip(columns, row))
-                
-                # Create publication dict (API format)
-                pub = {
-                    'id': data['api_id'],
-                    'data_disponibilizacao': data['data_disponibilizacao'],
-                    'siglaTribunal': data['sigla_tribunal'],
-                    'tipoComunicacao': data['tipo_comunicacao'],
-                    'nomeOrgao': data['nome_orgao'],
-                    'texto': data['texto'],
-                    'numero_processo': data['numero_processo'],
-                    'numeroprocessocommascara': data['numeroprocessocommascara'],
-                    'meio': data['meio'],
-                    'link': data['link'],
-                    'tipoDocumento': data['tipo_documento'],
-                    'nomeClasse': data['nome_classe'],
-                    'codigoClasse': data['codigo_classe'],
-                    'numeroComunicacao': data['numero_comunicacao'],
-                    'ativo': data['ativo'],
-                    'hash': data['hash'],
-                    'datadisponibilizacao': data['datadisponibilizacao'],
-                    'meiocompleto': data['meio_completo'],
-                    '_source_rule': data['source_rule'],
-                    '_db_id': data['id']
-                }
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute(f"""
+                    SELECT {_PUBLICATION_COLUMNS}, {_DESTINATARIOS_JSON},
+                           a.id as analysis_id, a.filename, a.original_filename, 
+                           a.upload_date, a.uploaded_by,
+                           p.date
+                    FROM publications p
+                    JOIN analyses a ON p.id = a.publication_id
+                    WHERE p.date = ?
+                    ORDER BY p.numeroprocessocommascara
+                """, (date,))
                 
-                # Get destinatarios for this publication
-                dest_cursor = conn.execute("""
-                    SELECT nome, polo, comunicacao_id FROM destinatarios WHERE publication_id = ?
-                """, (data['id'],))
-                pub['destinatarios'] = [
-                    {'nome': row[0], 'polo': row[1], 'comunicacao_id': row[2]}
-                    for row in dest_cursor.fetchall()
-                ]
-                
-                # Create analysis dict
-                analysis = {
-                    'id': data['analysis_id'],
-                    'filename': data['filename'],
-                    'original_filename': data['original_filename'],
-                    'html_content': data['html_content'],
-                    'upload_date': data['upload_date'],
-                    'uploaded_by': data['uploaded_by']
-                }
+                publications_with_analyses = []
                 
-                publications_with_analyses.append({
-                    'publication': pub,
-                    'analysis': analysis
-                })
-            
-            return publications_with_analyses
-            
-        except Exception as e:
-            logging.error(f"Error getting publications with analyses by date: {str(e)}")
-            return []
-        finally:
-            conn.close()
-    
-    def get_publications_by_date_range(self, start_date: str, end_date: str, selected_tribunals: list = None) -> List[Dict]:
-        """Get publications within a date range, optionally filtered by tribunals"""
-        conn = self.get_connection()
-        try:
-            base_query = """
-                SELECT p.*, json_extract(p.raw_data, '$') as full_data
-                FROM publications p
-                JOIN search_executions se ON p.search_execution_id = se.id
-                WHERE se.date >= ? AND se.date <= ?
-            """
-            params = [start_date, end_date]
-            
-            if selected_tribunals:
-                placeholders = ','.join(['?' for _ in selected_tribunals])
-                base_query += f" AND p.sigla_tribunal IN ({placeholders})"
-                params.extend(selected_tribunals)
-            
-            base_query += " ORDER BY se.date DESC, p.id DESC"
-            
-            cursor = conn.execute(base_query, params)
-            
-            publications = []
-            columns = [desc[0] for desc in cursor.description]
-            
-            for row in cursor.fetchall():
-                pub = dict(zip(columns, row))
-                
-                # Parse the raw_data JSON for additional fields
-                if pub.get('full_data'):
-                    try:
-                        import json
-                        full_data = json.loads(pub['full_data'])
-                        # Add missing fields from raw data
-                        for key in ['siglaTribunal', 'tipoComunicacao', 'nomeOrgao', 'nomeClasse', 'tipoDocumento', 'datadisponibilizacao']:
-                            if key not in pub or not pub[key]:
-                                pub[key] = full_data.get(key)
-                    except:
-                        pass
-                
-                # Get destinatarios
-                dest_cursor = conn.execute("SELECT * FROM destinatarios WHERE publication_id = ?", (pub['id'],))
-                pub['destinatarios'] = [dict(zip([desc[0] for desc in dest_cursor.description], dest_row)) 
-                                       for dest_row in dest_cursor.fetchall()]
-                
-                # Get advogados
-                adv_cursor = conn.execute("""
-                    SELECT a.*, pa.comunicacao_id 
-                    FROM advogados a 
-                    JOIN publication_advogados pa ON a.advogado_id = pa.advogado_id 
-                    WHERE pa.publication_id = ?
-                """, (pub['id'],))
-                pub['advogados'] = [dict(zip([desc[0] for desc in adv_cursor.description], adv_row)) 
-                                   for adv_row in adv_cursor.fetchall()]
-                
-                publications.append(pub)
-            
-            return publications
-            
-        except Exception as e:
-            logging.error(f"Error getting publications by date range: {str(e)}")
-            return []
-        finally:
-            conn.close()
+                for data in cursor:
+                    # Create publication dict (API format)
+                    pub = {
+                        'id': data['api_id'],
+                        'data_disponibilizacao': data['data_disponibilizacao'],
+                        'siglaTribunal': data['sigla_tribunal'],
+                        'tipoComunicacao': data['tipo_comunicacao'],
+                        'nomeOrgao': data['nome_orgao'],
+                        'texto': data['texto'],
+                        'numero_processo': data['numero_processo'],
+                        'numeroprocessocommascara': data['numeroprocessocommascara'],
+                        'meio': data['meio'],
+                        'link': data['link'],
+                        'tipoDocumento': data['tipo_documento'],
+                        'nomeClasse': data['nome_classe'],
+                        'codigoClasse': data['codigo_classe'],
+                        'numeroComunicacao': data['numero_comunicacao'],
+                        'ativo': data['ativo'],
+                        'hash': data['hash'],
+                        'datadisponibilizacao': data['datadisponibilizacao'],
+                        'meiocompleto': data['meio_completo'],
+                        '_source_rule': data['source_rule'],
+                        '_db_id': data['id'],
+                        'destinatarios': json_loads(data['destinatarios_json'])
+                    }
+                    
+                    # Create analysis dict (html_content is loaded on demand via get_analysis_html)
+                    analysis = {
+                        'id': data['analysis_id'],
+                        'filename': data['filename'],
+                        'original_filename': data['original_filename'],
+                        'upload_date': data['upload_date'],
+                        'uploaded_by': data['uploaded_by']
+                    }
+                    
+                    publications_with_analyses.append({
+                        'publication': pub,
+                        'analysis': analysis
+                    })
+                
+                return publications_with_analyses
+                
+            except Exception as e:
+                logging.error(f"Error getting publications with analyses by date: {str(e)}")
+                return []
     
-    def get_search_executions_by_date_range(self, start_date: str, end_date: str) -> List[Dict]:
-        """Get search executions within a date range"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT * FROM search_executions 
-                WHERE date >= ? AND date <= ?
-                ORDER BY date DESC, timestamp DESC
-            """, (start_date, end_date))
-            
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
-            
-        except Exception as e:
-            logging.error(f"Error getting search executions by date range: {str(e)}")
-            return []
-        finally:
-            conn.close()
+    def get_dashboard_counts(self, start_date: str, end_date: str) -> Tuple[int, int, int]:
+        """Get (search executions, publications, publications in the date range) in one round-trip"""
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM search_executions),
+                        (SELECT COUNT(*) FROM publications),
+                        (SELECT COUNT(*) FROM publications p
+                         JOIN search_executions se ON p.search_execution_id = se.id
+                         WHERE se.date >= ? AND se.date <= ?)
+                """, (start_date, end_date))
+                return tuple(cursor.fetchone())
+                
+            except Exception as e:
+                logging.error(f"Error getting dashboard counts: {str(e)}")
+                return (0, 0, 0)
     
-    def get_analyses_by_date_range(self, start_date: str, end_date: str) -> List[Dict]:
-        """Get analyses within a date range"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT a.*, se.date as search_date
-                FROM analyses a
-                JOIN publications p ON a.publication_id = p.id
-                JOIN search_executions se ON p.search_execution_id = se.id
-                WHERE se.date >= ? AND se.date <= ?
-                ORDER BY a.uploaded_at DESC
-            """, (start_date, end_date))
-            
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
-            
-        except Exception as e:
-            logging.error(f"Error getting analyses by date range: {str(e)}")
-            return []
-        finally:
-            conn.close()
+    def get_dashboard_aggregates(self, start_date: str, end_date: str,
+                                 selected_tribunals: list = None) -> Dict[str, 'pd.DataFrame']:
+        """Get dashboard KPIs and chart counts for a date range, aggregated by SQLite.
+        Returns small DataFrames: kpis, by_day, by_tribunal (top 10), by_class (top 10) and by_comm_type."""
+        import pandas as pd
+        
+        with self._reader() as conn:
+            try:
+                # Scan the matching publications once into a temp table; every aggregate reads from it
+                query = """
+                    CREATE TEMP TABLE dashboard_pubs AS
+                    SELECT p.id, p.sigla_tribunal, p.tipo_comunicacao, p.nome_classe, p.datadisponibilizacao
+                    FROM publications p
+                    JOIN search_executions se ON p.search_execution_id = se.id
+                    WHERE se.date >= ? AND se.date <= ?
+                """
+                params = [start_date, end_date]
+                
+                if selected_tribunals:
+                    placeholders = ','.join(['?' for _ in selected_tribunals])
+                    query += f" AND p.sigla_tribunal IN ({placeholders})"
+                    params.extend(selected_tribunals)
+                
+                conn.execute(query, params)
+                
+                def counts_by(column: str, limit: int = -1) -> pd.DataFrame:
+                    return pd.read_sql_query(f"""
+                        SELECT {column} AS label, COUNT(*) AS count
+                        FROM dashboard_pubs
+                        WHERE {column} IS NOT NULL AND {column} != ''
+                        GROUP BY {column}
+                        ORDER BY count DESC
+                        LIMIT ?
+                    """, conn, params=(limit,))
+                
+                return {
+                    'kpis': pd.read_sql_query("""
+                        SELECT
+                            COUNT(*) AS total_publications,
+                            COUNT(DISTINCT NULLIF(sigla_tribunal, '')) AS active_tribunals,
+                            (SELECT COUNT(DISTINCT NULLIF(a.numero_oab, ''))
+                             FROM publication_advogados pa
+                             JOIN advogados a ON a.advogado_id = pa.advogado_id
+                             WHERE pa.publication_id IN (SELECT id FROM dashboard_pubs)) AS unique_lawyers,
+                            (SELECT COUNT(*) FROM analyses
+                             WHERE publication_id IN (SELECT id FROM dashboard_pubs)) AS total_analyses
+                        FROM dashboard_pubs
+                    """, conn),
+                    'by_day': counts_by('datadisponibilizacao'),
+                    'by_tribunal': counts_by('sigla_tribunal', limit=10),
+                    'by_class': counts_by('nome_classe', limit=10),
+                    'by_comm_type': counts_by('tipo_comunicacao')
+                }
+                
+            except Exception as e:
+                logging.error(f"Error getting dashboard aggregates: {str(e)}")
+                return {}
+            finally:
+                # The connection outlives this call, so don't leave the temp table behind for the next one
+                conn.execute("DROP TABLE IF EXISTS temp.dashboard_pubs")
     
     def get_available_tribunals(self) -> List[str]:
         """Get list of available tribunals from publications"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT DISTINCT sigla_tribunal 
-                FROM publications 
-                WHERE sigla_tribunal IS NOT NULL AND sigla_tribunal != ''
-                ORDER BY sigla_tribunal
-            """)
-            
-            return [row[0] for row in cursor.fetchall()]
-            
-        except Exception as e:
-            logging.error(f"Error getting available tribunals: {str(e)}")
-            return []
-        finally:
-            conn.close()
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT DISTINCT sigla_tribunal 
+                    FROM publications 
+                    WHERE sigla_tribunal IS NOT NULL AND sigla_tribunal != ''
+                    ORDER BY sigla_tribunal
+                """)
+                
+                return [row[0] for row in cursor]
+                
+            except Exception as e:
+                logging.error(f"Error getting available tribunals: {str(e)}")
+                return []
 
     def get_search_history(self, limit: int = 50) -> List[Dict]:
         """Get search execution history"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT id, name, date, timestamp, rules_executed, publications_found
-                FROM search_executions 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (limit,))
-            
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
-            
-        except Exception as e:
-            logging.error(f"Error getting search history: {str(e)}")
-            return []
-        finally:
-            conn.close()
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT id, name, date, timestamp, rules_executed, publications_found
+                    FROM search_executions 
+                    ORDER BY timestamp DESC 
+                    LIMIT ?
+                """, (limit,))
+                
+                return [dict(row) for row in cursor]
+                
+            except Exception as e:
+                logging.error(f"Error getting search history: {str(e)}")
+                return []
     
     def get_publications_for_date_dropdown(self, date: str) -> List[Dict]:
         """Get publications for dropdown selection (processo + resumo)"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT p.id, p.numeroprocessocommascara, p.nome_orgao, p.tipo_comunicacao, 
-                       p.texto, se.date
-                FROM publications p
-                JOIN search_executions se ON p.search_execution_id = se.id
-                WHERE se.date = ?
-                ORDER BY p.numeroprocessocommascara
-            """, (date,))
-            
-            publications = []
-            columns = [desc[0] for desc in cursor.description]
-            
-            for row in cursor.fetchall():
-                pub = dict(zip(columns, row))
-                # Create display text for dropdown
-                texto_resumo = pub['texto'][:100] + '...' if pub['texto'] and len(pub['texto']) > 100 else pub['texto'] or ''
-                pub['display_text'] = f"{pub['numeroprocessocommascara']} - {pub['nome_orgao']} - {texto_resumo}"
-                publications.append(pub)
-            
-            return publications
-            
-        except Exception as e:
-            logging.error(f"Error getting publications for dropdown: {str(e)}")
-            return []
-        finally:
-            conn.close()
+        with self._reader() as conn:
+            try:
+                # Build the display text in SQLite so only the start of texto ever reaches Python
+                cursor = conn.execute("""
+                    SELECT p.id, p.numeroprocessocommascara, p.nome_orgao, p.tipo_comunicacao, p.date,
+                           printf('%s - %s - %s', p.numeroprocessocommascara, p.nome_orgao,
+                                  CASE WHEN length(p.texto) > 100 THEN substr(p.texto, 1, 100) || '...'
+                                       ELSE COALESCE(p.texto, '') END) AS display_text
+                    FROM publications p
+                    WHERE p.date = ?
+                    ORDER BY p.numeroprocessocommascara
+                """, (date,))
+                
+                return [dict(row) for row in cursor]
+                
+            except Exception as e:
+                logging.error(f"Error getting publications for dropdown: {str(e)}")
+                return []
     
     def save_analysis(self, publication_id: int, filename: str, original_filename: str, 
                      html_content: str, uploaded_by: str) -> int:
         """Save an analysis linked to a publication"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                INSERT INTO analyses (publication_id, filename, original_filename, html_content, uploaded_by)
-                VALUES (?, ?, ?, ?, ?)
-            """, (publication_id, filename, original_filename, html_content, uploaded_by))
-            
-            analysis_id = cursor.lastrowid
-            conn.commit()
-            
-            logging.info(f"Analysis saved with ID {analysis_id} for publication {publication_id}")
-            return analysis_id
-            
-        except Exception as e:
-            logging.error(f"Error saving analysis: {str(e)}")
-            conn.rollback()
-            raise
-        finally:
-            conn.close()
+        with self._write_lock:
+            conn = self.get_connection()
+            try:
+                # The upload can't be recreated, so make this commit durable even on power loss
+                conn.execute("PRAGMA synchronous=FULL")
+                cursor = conn.execute("""
+                    INSERT INTO analyses (publication_id, filename, original_filename, html_content, uploaded_by)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (publication_id, filename, original_filename, html_content, uploaded_by))
+                
+                analysis_id = cursor.lastrowid
+                conn.commit()
+                
+                logging.info(f"Analysis saved with ID {analysis_id} for publication {publication_id}")
+                return analysis_id
+                
+            except Exception as e:
+                logging.error(f"Error saving analysis: {str(e)}")
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
     
     def get_analysis_for_publication(self, publication_id: int) -> Optional[Dict]:
         """Get analysis for a specific publication"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT * FROM analyses WHERE publication_id = ? ORDER BY upload_date DESC LIMIT 1
-            """, (publication_id,))
-            
-            row = cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
-            return None
-            
-        except Exception as e:
-            logging.error(f"Error getting analysis for publication: {str(e)}")
-            return None
-        finally:
-            conn.close()
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT * FROM analyses WHERE publication_id = ? ORDER BY upload_date DESC LIMIT 1
+                """, (publication_id,))
+                
+                row = cursor.fetchone()
+                if row:
+                    return dict(row)
+                return None
+                
+            except Exception as e:
+                logging.error(f"Error getting analysis for publication: {str(e)}")
+                return None
+    
+    def get_analysis_html(self, analysis_id: int) -> Optional[str]:
+        """Get the HTML content of a single analysis"""
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("SELECT html_content FROM analyses WHERE id = ?", (analysis_id,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+                
+            except Exception as e:
+                logging.error(f"Error getting analysis HTML: {str(e)}")
+                return None
     
+    def get_analyses_version(self) -> Tuple[int, int, int]:
+        """Get a cheap fingerprint of the analyses and the publications they point at:
+        (analyses count, highest analysis id, highest publication id). Re-running a search
+        re-inserts its publications under new ids, which moves the last value."""
+        with self._reader() as conn:
+            try:
+                cursor = conn.execute("""
+                    SELECT COUNT(*), COALESCE(MAX(id), 0),
+                           (SELECT COALESCE(MAX(id), 0) FROM publications)
+                    FROM analyses
+                """)
+                return tuple(cursor.fetchone())
+
+            except Exception as e:
+                logging.error(f"Error getting analyses version: {str(e)}")
+                return (0, 0, 0)
+
     def delete_analysis(self, analysis_id: int) -> bool:
         """Delete an analysis"""
-        conn = self.get_connection()
-        try:
-            conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
-            conn.commit()
-            logging.info(f"Analysis {analysis_id} deleted")
-            return True
-            
-        except Exception as e:
-            logging.error(f"Error deleting analysis: {str(e)}")
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+        with self._write_lock:
+            conn = self.get_connection()
+            try:
+                conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+                conn.commit()
+                logging.info(f"Analysis {analysis_id} deleted")
+                return True
+                
+            except Exception as e:
+                logging.error(f"Error deleting analysis: {str(e)}")
+                conn.rollback()
+                return False
+
+    def delete_analyses(self, analysis_ids: List[int]) -> int:
+        """Delete several analyses in one statement, returning how many were removed"""
+        if not analysis_ids:
+            return 0
+        
+        with self._write_lock:
+            conn = self.get_connection()
+            try:
+                placeholders = ','.join(['?' for _ in analysis_ids])
+                cursor = conn.execute(f"DELETE FROM analyses WHERE id IN ({placeholders})", list(analysis_ids))
+                conn.commit()
+                logging.info(f"{cursor.rowcount} analyses deleted")
+                return cursor.rowcount
+                
+            except Exception as e:
+                logging.error(f"Error deleting analyses: {str(e)}")
+                conn.rollback()
+                return 0
 
     def get_statistics(self) -> Dict:
         """Get database statistics"""
-        conn = self.get_connection()
-        try:
-            stats = {}
-            
-            # Total search executions
-            cursor = conn.execute("SELECT COUNT(*) FROM search_executions")
-            stats['total_searches'] = cursor.fetchone()[0]
-            
-            # Total publications
-            cursor = conn.execute("SELECT COUNT(*) FROM publications")
-            stats['total_publications'] = cursor.fetchone()[0]
-            
-            # Total analyses
-            cursor = conn.execute("SELECT COUNT(*) FROM analyses")
-            stats['total_analyses'] = cursor.fetchone()[0]
-            
-            # Total unique advogados
-            cursor = conn.execute("SELECT COUNT(*) FROM advogados")
-            stats['total_advogados'] = cursor.fetchone()[0]
-            
-            # Publications by tribunal
-            cursor = conn.execute("""
-                SELECT sigla_tribunal, COUNT(*) 
-                FROM publications 
-                GROUP BY sigla_tribunal 
-                ORDER BY COUNT(*) DESC
-            """)
-            stats['publications_by_tribunal'] = dict(cursor.fetchall())
-            
-            return stats
-            
-        except Exception as e:
-            logging.error(f"Error getting statistics: {str(e)}")
-            return {}
-        finally:
-            conn.close()
\ No newline at end of file
+        with self._reader() as conn:
+            try:
+                # Totals of search executions, publications, analyses and unique advogados in one query
+                stats = dict(conn.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM search_executions) AS total_searches,
+                        (SELECT COUNT(*) FROM publications) AS total_publications,
+                        (SELECT COUNT(*) FROM analyses) AS total_analyses,
+                        (SELECT COUNT(*) FROM advogados) AS total_advogados
+                """).fetchone())
+                
+                # Publications by tribunal
+                cursor = conn.execute("""
+                    SELECT sigla_tribunal, COUNT(*) 
+                    FROM publications 
+                    GROUP BY sigla_tribunal 
+                    ORDER BY COUNT(*) DESC
+                """)
+                stats['publications_by_tribunal'] = dict(cursor)
+                
+                return stats
+                
+            except Exception as e:
+                logging.error(f"Error getting statistics: {str(e)}")
+                return {}
\ No newline at end of file
@@ -615,7 +615,13 @@ def display_publication_card(pub: Dict, index: int):
         st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("---")
 
-def display_publication_with_analysis(pub: Dict, analysis: Dict, index: int):
+@st.cache_data(max_entries=64)
+def load_analysis_html(analysis_id: int, _db) -> Optional[str]:
+    """Carrega o HTML de uma análise do banco de dados (imutável por ID, por isso em cache).
+    _db é o DatabaseManager compartilhado do app; o prefixo _ o deixa fora da chave do cache"""
+    return _db.get_analysis_html(analysis_id)
+
+def display_publication_with_analysis(pub: Dict, analysis: Dict, index: int, db):
     """Exibe uma publicação COM análise vinculada (só para página Análises Inteligentes)"""
     with st.container():
         st.markdown(f"""
@@ -663,9 +669,14 @@ def display_publication_with_analysis(pub: Dict, analysis: Dict, index: int):
         st.markdown("---")
         st.markdown("### 🧠 **Análise Inteligente**")
         
-        # Conteúdo HTML da análise
-        with st.container():
-            st.components.v1.html(analysis['html_content'], height=500, scrolling=True)
+        # Conteúdo HTML da análise (carregado apenas quando o usuário abre a análise)
+        if st.toggle("📖 Mostrar análise", key=f"exp_analysis_{analysis['id']}"):
+            html_content = load_analysis_html(analysis['id'], db)
+            with st.container():
+                if html_content:
+                    st.components.v1.html(html_content, height=500, scrolling=True)
+                else:
+                    st.warning("⚠️ Conteúdo da análise não encontrado.")
         
         st.markdown("---")
 
@@ -26,7 +26,7 @@ class RuleOperator(Enum):
     AND = "and"
     OR = "or"
 
-@dataclass
+@dataclass(slots=True)
 class SearchRule:
     name: str
     rule_type: RuleType